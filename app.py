@@ -1,18 +1,26 @@
 import os
 import io
 import csv
+import json
 import re
 import math
 import tempfile
 import datetime
-from bisect import bisect_right
 from collections import Counter
 
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 
 import main_module as core
+import charts
+import gaps
+import batch_recommend
+import similar
+import scoring
+import report
+import scheduler
+import jobs
+import perf
 
 # ========== 全域設定 ==========
 APP_VERSION = "v2.1 (Streamlit optimized)"
@@ -37,11 +45,18 @@ def _normalize_date(v):
         s = v.strip()
         for fmt in ("%Y/%m/%d", "%Y-%m-%d", "%Y/%m/%d %H:%M", "%Y-%m-%d %H:%M:%S"):
             try: return datetime.datetime.strptime(s, fmt).date()
-            except: pass
+            except ValueError: pass
     return None
 
-@st.cache_data(show_spinner=False, ttl=300)
+def _excel_mtime():
+    return os.path.getmtime(EXCEL_FILE) if os.path.exists(EXCEL_FILE) else 0.0
+
 def _load_all_draws():
+    """載入全部開獎紀錄；以 Excel 修改時間當快取鍵，檔案更新後自動重新載入"""
+    return _load_draws_cached(_excel_mtime())
+
+@st.cache_data(show_spinner=False, ttl=300)
+def _load_draws_cached(mtime):
     """載入全部開獎紀錄（快取 5 分鐘）"""
     wb = core.prepare_workbook()
     draws = []
@@ -60,16 +75,58 @@ def _get_latest_draw():
     d = _load_all_draws()
     return d[-1] if d else (None, set())
 
-def _parse_csv_date(s: str):
-    s = (s or "").strip()
-    for fmt in ("%Y-%m-%d","%Y/%m/%d","%Y-%m-%d %H:%M","%Y/%m/%d %H:%M","%Y-%m-%d %H:%M:%S","%Y/%m/%d %H:%M:%S"):
-        try: return datetime.datetime.strptime(s, fmt).date()
-        except: pass
-    m = re.match(r"^\s*(\d{4})[/-](\d{1,2})[/-](\d{1,2})", s)
-    if m:
-        y, mth, d = map(int, m.groups())
-        return datetime.date(y, mth, d)
-    return None
+@st.cache_resource
+def _job_manager():
+    """所有 session 共用同一個背景執行器，同時按下更新只會跑一次"""
+    return jobs.JobManager(max_workers=2)
+
+def _workbook_job(func):
+    """讀寫 Excel 的背景工作共用 core.workbook_lock，更新與轉移分析不會同時存取 Excel"""
+    return jobs.exclusive(core.workbook_lock, func, "等待其他 Excel 工作完成…")
+
+def _start_job(key, func, *args):
+    """送出背景工作並記在本 session；同一個 key 已在執行時直接跟隨既有工作"""
+    job = _job_manager().submit(key, func, *args)
+    st.session_state.setdefault("jobs", {})[key] = job
+    st.session_state.setdefault("job_results", {}).pop(key, None)
+    return job
+
+@st.fragment(run_every=1)
+def _job_panel(key, label, on_done, fail_msg):
+    """
+    只重繪這一塊：本 session 送出的工作進行中時顯示進度，頁面其餘部分照常運作；
+    完成後把結果訊息存進 session 並重跑整頁一次（讓其他區塊讀到新資料）。
+    """
+    job = st.session_state.get("jobs", {}).get(key)
+    if job is not None:
+        if not job.done:
+            st.progress(job.progress, text=f"{label} {job.message}")
+            return
+        del st.session_state["jobs"][key]
+        try:
+            messages = on_done(job.result())
+        except Exception as e:
+            messages = [("error", f"{fail_msg}：{e}")]
+        st.session_state.setdefault("job_results", {})[key] = messages
+        st.rerun(scope="app")
+    elif _job_manager().running(key):
+        st.caption("其他使用者送出的工作正在進行，完成後重新整理即可看到新資料。")
+    for level, text in st.session_state.get("job_results", {}).get(key, []):
+        getattr(st, level)(text)
+
+def _update_job(job, start_year, end_year, months):
+    with perf.profile("update"):
+        core.update_history(start_year, end_year, months, progress=job.report)
+        job.report(1, 1, "更新今日資料")
+        return core.update_today()
+
+def _update_done(updated_today):
+    _load_draws_cached.clear()  # 只清開獎資料快取，其餘快取不受影響
+    return [("success", "✅ 資料更新完成！"),
+            ("info", "今天資料已更新。" if updated_today else "今天尚未開獎或無資料。")]
+
+def _transition_job(job):
+    core.analyze_transition_patterns(progress=job.report)
 
 def _download_bytes(name: str, data: bytes, label: str):
     st.download_button(label, data=data, file_name=name)
@@ -101,6 +158,41 @@ if st.sidebar.button("🗑 清空推薦歷史檔(TXT/CSV)"):
         st.sidebar.info("沒有可刪檔案")
 
 st.sidebar.markdown("---")
+def _toggle_perf():
+    # 只在使用者真的切換時才改動；perf.ENABLED 是整個行程共用的，其他 session 重跑不會覆蓋
+    perf.enable(st.session_state["perf_enabled"])
+
+with st.sidebar.expander("⏱ 效能"):
+    st.session_state["perf_enabled"] = perf.ENABLED   # 顯示目前的實際狀態（可能由其他 session 切換）
+    st.checkbox("啟用效能量測", key="perf_enabled", on_change=_toggle_perf,
+                help="所有使用者共用同一個開關；關閉時幾乎沒有額外成本")
+    _perf = perf.snapshot()
+    if _perf["spans"]:
+        st.dataframe(pd.DataFrame(_perf["spans"]).T.sort_values("total", ascending=False),
+                     use_container_width=True)
+    if _perf["counters"]:
+        st.json(_perf["counters"])
+    pc1, pc2 = st.columns(2)
+    if pc1.button("重設"):
+        perf.reset()
+    pc2.download_button("下載 JSON", data=json.dumps(_perf, ensure_ascii=False, indent=2),
+                        file_name="perf.json")
+
+st.sidebar.markdown("---")
+_daemon = scheduler.read_status()
+if _daemon:
+    with st.sidebar.expander("🕒 背景更新狀態"):
+        _st = _daemon["status"]
+        st.write(f"狀態：{_st['state']}　最後檢查：{_st['last_check']}")
+        st.write(f"最後更新：{_st['last_update']}　下次喚醒：{_st['next_wake']}")
+        if _st["last_error"]:
+            st.error(_st["last_error"])
+        st.json(_st["timings"])
+        _derived = _daemon.get("derived")
+        if _derived:
+            st.write(f"共 {_derived['draw_count']} 期，號碼出現次數（背景程式預先計算）：")
+            st.bar_chart(pd.Series({int(n): c for n, c in _derived["frequency"].items()}, name="次數"))
+            st.dataframe(pd.DataFrame(_derived["frequency_by_year"]).T, use_container_width=True)
 st.sidebar.caption(f"{APP_VERSION}")
 
 # ========== 主標題 ==========
@@ -108,44 +200,30 @@ st.title("🎯 今彩539 資料分析網頁版（優化）")
 st.write("更新資料、建立號碼轉移分析、推薦號碼、對獎檢查與組合金額試算。")
 
 # ========== 功能：更新資料 ==========
+jm = _job_manager()
 col1, col2 = st.columns(2)
 with col1:
     if st.button("📥 一鍵更新資料（歷史+今日）"):
-        try:
-            if apply_override:
-                # 動態覆寫 core 的設定（僅此行程有效，不改檔案）
-                try:
-                    core.START_YEAR = int(override_year_start)
-                    core.END_YEAR   = int(override_year_end)
-                    ms = [int(x) for x in re.split(r"[,\s]+", months_str) if x.strip()]
-                    core.MONTHS = [m for m in ms if 1 <= m <= 12] or list(range(1,13))
-                except Exception as e:
-                    st.warning(f"覆寫參數解析失敗，使用預設設定。{e}")
-
-            with st.spinner("更新歷史資料中…"):
-                core.update_history()
-            with st.spinner("更新今日資料中…"):
-                updated_today = core.update_today()
-
-            st.success("✅ 資料更新完成！")
-            if updated_today:
-                st.info("今天資料已更新。")
-            else:
-                st.info("今天尚未開獎或無資料。")
-
-            st.cache_data.clear()  # 更新後刷新快取
-        except Exception as e:
-            st.error(f"更新失敗：{e}")
+        start_year = end_year = months = None
+        if apply_override:
+            # 只傳給本次更新，不改動 core 的全域設定
+            try:
+                start_year = int(override_year_start)
+                end_year   = int(override_year_end)
+                ms = [int(x) for x in re.split(r"[,\s]+", months_str) if x.strip()]
+                months = [m for m in ms if 1 <= m <= 12] or list(range(1,13))
+            except Exception as e:
+                st.warning(f"覆寫參數解析失敗，使用預設設定。{e}")
+        if jm.running("update"):
+            st.info("已有更新正在進行，直接等待其結果。")
+        _start_job("update", _workbook_job(_update_job), start_year, end_year, months)
+    _job_panel("update", "更新資料中…", _update_done, "更新失敗")
 
 # ========== 功能：建立轉移分析 ==========
 with col2:
     if st.button("🔁 建立號碼轉移分析"):
-        try:
-            with st.spinner("建立中…"):
-                core.analyze_transition_patterns()
-            st.success("✅ 轉移分析完成！")
-        except Exception as e:
-            st.error(f"分析失敗：{e}")
+        _start_job("transitions", _workbook_job(_transition_job))
+    _job_panel("transitions", "建立中…", lambda _: [("success", "✅ 轉移分析完成！")], "分析失敗")
 
 # ========== 功能：顯示與寫入推薦 ==========
 st.markdown("### 🎯 顯示推薦號碼")
@@ -154,15 +232,37 @@ st.markdown("### 🎯 顯示推薦號碼")
 if "last_reco" not in st.session_state:
     st.session_state["last_reco"] = None  # dict: {msg, now_str, base_date, top5}
 
+with st.expander("推薦設定（綜合評分權重與餘數配額）"):
+    _engine = scoring.ScoringEngine()
+    cols = st.columns(3)
+    score_weights = {
+        name: cols[i % 3].slider(name, 0.0, 2.0, float(_engine.weights.get(name, 0.0)), 0.1, key=f"w_{name}")
+        for i, name in enumerate(scoring.SCORERS)
+    }
+    _quota = _engine.quota or {}
+    use_quota = st.checkbox("啟用餘數配額（推薦 10 碼中「除以 k 餘 r」的號碼數量）", value=bool(_quota))
+    qc = st.columns(4)
+    quota_k = qc[0].number_input("k", min_value=2, max_value=10, value=int(_quota.get("k", 3)), disabled=not use_quota)
+    quota_r = qc[1].number_input("r", min_value=0, max_value=9, value=int(_quota.get("r", 0)), disabled=not use_quota)
+    quota_min = qc[2].number_input("最少", min_value=0, max_value=10, value=int(_quota.get("min", 1)), disabled=not use_quota)
+    quota_max = qc[3].number_input("最多", min_value=0, max_value=10, value=int(_quota.get("max", 3)), disabled=not use_quota)
+
 # 產生推薦
 if st.button("產生推薦"):
     try:
-        result = core.recommend_by_transition()
+        quota = {}
+        if use_quota:
+            quota = scoring.parse_quota(f"{quota_k}:{quota_r}:{quota_min}:{quota_max}")
+        draws = [(d.strftime("%Y-%m-%d"), sorted(nums)) for d, nums in _load_all_draws()]
+        result = core.recommend_by_score(score_weights, quota, draws)
         if not result:
-            st.warning("尚未有轉移分析結果，請先點『建立號碼轉移分析』")
+            st.warning("開獎資料不足，請先更新 Excel")
         else:
-            last_nums, top10, top5 = result
-            top3_m3 = [n for n in top10 if n % 3 == 0][:3]
+            last_nums, top10, top5, top3_m3 = (result["last_nums"], result["top10"], result["top5"],
+                                               result["multiples_of_3"])
+            timings = pd.DataFrame(
+                [(k, round(v * 1000, 2), "✓" if result["cached"][k] else "") for k, v in result["timings"].items()],
+                columns=["訊號", "耗時 (ms)", "快取"])
             base_date, _ = _get_latest_draw()
             now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             msg = (
@@ -178,6 +278,7 @@ if st.button("產生推薦"):
                 "now_str": now_str,
                 "base_date": base_date,
                 "top5": top5,
+                "timings": timings,
             }
     except Exception as e:
         st.error(f"推薦失敗：{e}")
@@ -187,6 +288,8 @@ if st.session_state["last_reco"]:
     st.text_area("最新推薦結果（已暫存，可直接寫入歷史）",
                  st.session_state["last_reco"]["msg"],
                  height=130)
+    if st.session_state["last_reco"].get("timings") is not None:
+        st.dataframe(st.session_state["last_reco"]["timings"], use_container_width=True, hide_index=True)
     c1, c2, c3 = st.columns(3)
 
     # 寫入推薦歷史
@@ -240,32 +343,9 @@ else:
 # ========== 功能：檢查是否中獎 ==========
 st.markdown("### 🔎 檢查推薦是否中獎（對照下一期）")
 def _check_hits_df():
-    if not os.path.exists(HISTORY_CSV):
-        return pd.DataFrame(columns=["推薦時間","基準日期","對獎日期","中獎數","中獎號"])
-
-    draws = _load_all_draws()
-    if not draws:
-        return pd.DataFrame(columns=["推薦時間","基準日期","對獎日期","中獎數","中獎號"])
-    dates = [d[0] for d in draws]
-
-    rows = []
-    with open(HISTORY_CSV, "r", encoding="utf-8") as f:
-        for ts_str, base_str, top5_str in csv.reader(f):
-            base_dt = _parse_csv_date(base_str)
-            if not base_dt:
-                rows.append((ts_str, base_str, "日期格式錯誤", "-", "-")); continue
-            try:
-                rec_top5 = set(int(x) for x in top5_str.split(",") if x.strip().isdigit())
-            except:
-                rec_top5 = set()
-            idx = bisect_right(dates, base_dt)
-            if idx >= len(dates):
-                rows.append((ts_str, base_str, "尚無下一期", "-", "-")); continue
-            target_dt, target_nums = draws[idx]
-            hits = sorted(rec_top5 & target_nums)
-            rows.append((ts_str, base_dt.strftime("%Y-%m-%d"), target_dt.strftime("%Y-%m-%d"), len(hits), hits))
-    df = pd.DataFrame(rows, columns=["推薦時間","基準日期","對獎日期","中獎數","中獎號"])
-    return df
+    draws = [(d.strftime("%Y-%m-%d"), sorted(nums)) for d, nums in _load_all_draws()]
+    rows = core.check_hits(draws, HISTORY_CSV) if draws else []
+    return pd.DataFrame(rows, columns=["推薦時間","基準日期","對獎日期","中獎數","中獎號"])
 
 if st.button("開始檢查"):
     df_hits = _check_hits_df()
@@ -275,6 +355,107 @@ if st.button("開始檢查"):
         df_hits.to_csv(csv_buf, index=False, encoding="utf-8-sig")
         _download_bytes("hits_check.csv", csv_buf.getvalue().encode("utf-8-sig"), "下載對獎結果")
 
+# ========== 功能：批次回測推薦 ==========
+st.markdown("### 📅 期間回測推薦（每一期當時會推薦什麼）")
+with st.form("batch_form"):
+    bc1, bc2 = st.columns(2)
+    _today = datetime.date.today()
+    batch_start = bc1.date_input("起始日期", _today.replace(day=1))
+    batch_end = bc2.date_input("結束日期", _today)
+    batch_pit = st.checkbox("只使用當時已知的資料（避免偷看未來）", value=True)
+    run_batch = st.form_submit_button("產生回測")
+if run_batch:
+    draws = _load_all_draws()
+    if not draws:
+        st.warning("沒有開獎資料，請先更新資料")
+    else:
+        # _load_all_draws 的日期是 date、號碼是 set，轉成 core.load_draws() 的格式
+        core_draws = [(d.strftime("%Y-%m-%d"), sorted(nums)) for d, nums in draws]
+        df_batch = batch_recommend.recommend_batch(start=batch_start.strftime("%Y-%m-%d"),
+                                                   end=batch_end.strftime("%Y-%m-%d"),
+                                                   point_in_time=batch_pit, draws=core_draws)
+        st.dataframe(df_batch, use_container_width=True, hide_index=True)
+        if not df_batch.empty:
+            st.caption(f"平均中獎數（前 5 碼）：{df_batch['中獎數'].dropna().mean():.2f}")
+            csv_buf = io.StringIO()
+            df_batch.to_csv(csv_buf, index=False, encoding="utf-8-sig")
+            _download_bytes("batch_recommend.csv", csv_buf.getvalue().encode("utf-8-sig"), "下載回測結果")
+
+# ========== 功能：相似歷史開獎 ==========
+st.markdown("### 🔍 相似歷史開獎")
+with st.form("similar_form"):
+    sim_str = st.text_input("查詢號碼（留空＝最近一期）", "")
+    sim_k = st.number_input("顯示筆數", min_value=1, max_value=100, value=10)
+    run_sim = st.form_submit_button("搜尋")
+if run_sim:
+    draws = _load_all_draws()
+    if not draws:
+        st.warning("沒有開獎資料，請先更新資料")
+    else:
+        index = similar.DrawIndex(draws)
+        if sim_str.strip():
+            q = sorted(set(int(t) for t in re.split(r"[,\s]+", sim_str.strip()) if t.isdigit() and 1 <= int(t) <= 39))
+            results = index.query(q, int(sim_k)) if q else []
+        else:
+            results = index.query_latest(int(sim_k))
+        df_sim = pd.DataFrame([(r["date"], r["nums"], r["overlap"], r["jaccard"], r["common"],
+                                r["next_date"], r["next_nums"]) for r in results],
+                              columns=["日期", "號碼", "重疊數", "Jaccard", "共同號碼", "下一期日期", "下一期號碼"])
+        st.dataframe(df_sim, use_container_width=True, hide_index=True)
+
+# ========== 功能：號碼遺漏 ==========
+st.markdown("### 🧊 號碼遺漏統計")
+if st.button("顯示遺漏表"):
+    draws = _load_all_draws()
+    if not draws:
+        st.warning("沒有開獎資料，請先更新資料")
+    else:
+        df_gap = pd.DataFrame(gaps.GapTracker.from_draws(draws).table())
+        st.dataframe(df_gap.sort_values("遺漏指數", ascending=False), use_container_width=True, hide_index=True)
+        st.caption("遺漏指數 = 目前遺漏 / 歷史平均遺漏；數值越大代表越久未開出。")
+
+# ========== 功能：圖表 ==========
+st.markdown("### 📊 圖表")
+chart_kind = st.selectbox("圖表類型", ["餘數類別出現次數", "各年度出現次數熱圖", "號碼轉移熱圖"])
+if chart_kind == "餘數類別出現次數":
+    ck1, ck2 = st.columns(2)
+    chart_k = int(ck1.number_input("除數 k", min_value=1, max_value=39, value=3))
+    chart_r = int(ck2.number_input("餘數 r", min_value=0, max_value=38, value=0))
+if st.button("產生圖表"):
+    draws = _load_all_draws()
+    if not draws:
+        st.warning("沒有開獎資料，請先更新資料")
+    else:
+        try:
+            # 圖檔依資料與參數雜湊快取，重跑時直接讀取既有檔案
+            if chart_kind == "餘數類別出現次數":
+                chart_path = charts.render_residue_chart(draws, k=chart_k, r=chart_r % chart_k)
+            elif chart_kind == "各年度出現次數熱圖":
+                chart_path = charts.render_frequency_heatmap(draws)
+            else:
+                chart_path = charts.render_transition_heatmap(draws)
+            st.image(chart_path, use_container_width=True)
+            with open(chart_path, "rb") as fh:
+                _download_bytes(os.path.basename(chart_path), fh.read(), "下載圖表")
+        except Exception as e:
+            st.error(f"產生圖表失敗：{e}")
+
+# ========== 功能：統計報表 ==========
+st.markdown("### 📑 統計報表")
+if st.button("產生統計報表（xlsx）"):
+    draws = _load_all_draws()
+    if not draws:
+        st.warning("沒有開獎資料，請先更新資料")
+    else:
+        try:
+            # 報表與開獎資料檔分開，寫在可寫目錄
+            core_draws = [(d.strftime("%Y-%m-%d"), sorted(nums)) for d, nums in draws]
+            report_path = report.export_report(os.path.join(SAFE_DIR, "539_report.xlsx"), draws=core_draws)
+            with open(report_path, "rb") as fh:
+                _download_bytes("539_report.xlsx", fh.read(), "下載統計報表")
+        except Exception as e:
+            st.error(f"產生報表失敗：{e}")
+
 # ========== 功能：組合與金額試算 ==========
 st.markdown("### 💰 組合與金額試算")
 with st.form("price_form"):
@@ -0,0 +1,109 @@
+# batch_recommend.py
+#
+# 一次算出多個基準期的轉移推薦（例如「這個月每天會推薦什麼」）：
+#   分數 = 基準期的出現列 (M, 39) @ 轉移矩陣 (39, 39)
+# point_in_time=True 時，每個基準期只使用到該期為止已知的轉移（不偷看未來），
+# 依基準期排序後逐段累加轉移矩陣，整體只需掃過歷史一次。
+#
+# 注意：recommend_by_transition() 讀的是轉移分析檔中每個號碼的前 10 名，
+# 這裡使用完整的轉移次數，所以排名可能略有不同。
+
+from bisect import bisect_left, bisect_right
+from datetime import date
+
+import numpy as np
+
+import main_module as core
+import perf
+
+COLUMNS = ["基準日期", "基準號碼", "推薦號碼", "前5", "下一期日期", "下一期號碼", "中獎數", "中獎號"]
+
+
+def _resolve(bases, dates):
+    """把基準（日期字串 / date / 期數索引）轉成期數索引；日期取當天或之前最近的一期"""
+    idx = []
+    for b in bases:
+        if isinstance(b, (int, np.integer)):
+            i = int(b) if b >= 0 else len(dates) + int(b)
+        else:
+            d = core.parse_date(str(b))
+            if d is None:
+                raise ValueError(f"無法解析的基準日期：{b}")
+            i = bisect_right(dates, d) - 1
+        if not 0 <= i < len(dates):
+            raise IndexError(f"基準超出資料範圍：{b}")
+        idx.append(i)
+    return np.array(idx, dtype=np.intp)
+
+
+def _bound(value, label):
+    """--start / --end 日期轉成 YYYY-MM-DD；無法解析時丟出 ValueError"""
+    d = core.parse_date(str(value))
+    try:
+        date.fromisoformat(d or "")
+    except ValueError:
+        raise ValueError(f"無法解析的{label}日期：{value}")
+    return d
+
+
+def score_matrix(X, idx, point_in_time=True):
+    """
+    回傳 (M, 39) 分數。
+      - point_in_time=False：全部歷史的轉移矩陣，一次矩陣乘法
+      - point_in_time=True：基準期 b 只計入 i → i+1（i+1 <= b）的轉移
+    """
+    X = X.astype(np.float32)
+    if not point_in_time:
+        T = X[:-1].T @ X[1:]
+        return X[idx] @ T
+    S = np.zeros((len(idx), 39), dtype=np.float32)
+    T = np.zeros((39, 39), dtype=np.float32)
+    done = 0                               # 已計入 i < done 的轉移
+    for pos in np.argsort(idx, kind="stable"):
+        b = idx[pos]
+        if b > done:
+            T += X[done:b].T @ X[done + 1:b + 1]
+            done = b
+        S[pos] = X[b] @ T
+    return S
+
+
+@perf.timed("recommend_batch")
+def recommend_batch(bases=None, start=None, end=None, point_in_time=True, top=10, draws=None):
+    """
+    批次推薦，回傳每個基準期一列的 DataFrame（欄位見 COLUMNS）。
+      - bases：日期或期數索引的清單
+      - start / end：未給 bases 時，取此日期區間（含）內的每一期
+      - draws：可傳入已載入的 core.load_draws() 結果
+    日期無法解析時丟出 ValueError，基準超出資料範圍時丟出 IndexError。
+    """
+    import pandas as pd
+    draws = draws if draws is not None else core.load_draws()
+    dates = [d for d, _ in draws]
+    if bases is None:
+        lo = bisect_left(dates, _bound(start, "起始")) if start else 0
+        hi = bisect_right(dates, _bound(end, "結束")) if end else len(dates)
+        idx = np.arange(lo, hi, dtype=np.intp)
+    else:
+        idx = _resolve(bases, dates)
+    if not len(idx):
+        return pd.DataFrame(columns=COLUMNS)
+
+    X = core.draw_matrix(draws)
+    S = score_matrix(X, idx, point_in_time)
+    S[X[idx].astype(bool)] = -1            # 與單筆推薦相同：排除基準期本身的號碼
+    ranked = np.argsort(-S, axis=1, kind="stable")[:, :top] + 1
+
+    rows = []
+    for i, rec in zip(idx.tolist(), ranked.tolist()):
+        top5 = rec[:5]
+        if i + 1 < len(draws):
+            next_date, next_nums = draws[i + 1]
+            hits = sorted(set(top5) & set(next_nums))
+            rows.append((dates[i], sorted(draws[i][1]), sorted(rec), top5,
+                         next_date, sorted(next_nums), len(hits), hits))
+        else:
+            rows.append((dates[i], sorted(draws[i][1]), sorted(rec), top5, None, None, None, None))
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df["中獎數"] = df["中獎數"].astype("Int64")     # 最後一期尚無下一期時保持整數欄位
+    return df
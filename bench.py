@@ -0,0 +1,177 @@
+# bench.py
+#
+# 各處理階段在不同資料量下的效能量測：
+#   - 以 synth.py 產生 1k ~ 1M 期的模擬歷史（固定 seed）
+#   - 每個階段跑兩次：先在關閉 tracemalloc 時計時，再另跑一次開啟 tracemalloc 量峰值記憶體
+#     （tracemalloc 會攔截每次配置，開著計時會把配置多的階段放大好幾倍）
+#   - 結果存成 JSON；指定 --baseline 時與舊結果比較，變慢超過門檻即列為退步並以結束碼 1 離開
+#
+# 執行：python bench.py --sizes 1000,10000,100000 --out bench.json [--baseline bench_base.json]
+# 所有檔案都寫在暫存資料夾，不會動到專案內的 539_by_year.xlsx。
+# 模擬歷史每年約 313 期，100k 期約跨 320 年、1M 期約跨 3,200 年（見 synth.draw_dates），
+# 活頁簿的年度分頁數遠多於實際資料，與分頁數相關的開銷在大資料量時會被放大。
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import main_module as core
+import excel
+import report
+import scoring
+import synth
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_THRESHOLD = 1.25     # 比基準慢 25% 以上視為退步
+MIN_SECONDS = 0.05           # 基準低於此值的階段誤差太大，不列入比較
+
+
+@contextmanager
+def _redirect(workdir):
+    """暫時把 core / excel / report 的檔案路徑指到 workdir"""
+    names = ("EXCEL_FILE", "TRANSITION_FILE", "LATEST_FILE", "CHART_FILE")
+    saved = {n: getattr(core, n) for n in names}
+    saved_excel = excel.EXCEL_FILE
+    saved_report = report.REPORT_FILE
+    saved_signals = scoring.SIGNALS_FILE
+    try:
+        for n in names:
+            setattr(core, n, os.path.join(workdir, os.path.basename(saved[n])))
+        excel.EXCEL_FILE = core.EXCEL_FILE
+        report.REPORT_FILE = os.path.join(workdir, os.path.basename(saved_report))
+        scoring.SIGNALS_FILE = os.path.join(workdir, os.path.basename(saved_signals))
+        yield
+    finally:
+        for n, v in saved.items():
+            setattr(core, n, v)
+        excel.EXCEL_FILE = saved_excel
+        report.REPORT_FILE = saved_report
+        scoring.SIGNALS_FILE = saved_signals
+
+
+def _write_history_csv(path, draws, count=1000):
+    """模擬推薦歷史：從各期平均取 count 筆當作基準日期"""
+    step = max(1, len(draws) // count)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(0, len(draws), step):
+            date, nums = draws[i]
+            f.write(f"{date} 00:00:00,{date},\"{','.join(map(str, nums))}\"\n")
+
+
+def _measure(func):
+    """耗時與峰值記憶體分兩次執行量測，計時的那次不開 tracemalloc"""
+    t0 = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - t0
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": round(seconds, 4), "peak_mb": round(peak / 2**20, 2)}
+
+
+def stages(workdir):
+    """(名稱, 函式)；每個函式會被 _measure 執行兩次，兩次的工作量需相同"""
+    history_csv = os.path.join(workdir, "recommend_history.csv")
+    new_record = {"lotteryDate": "9999-12-31T00:00:00", "drawNumberSize": [1, 2, 3, 4, 5]}
+
+    def check_hits():
+        core.check_hits(core.load_draws(), history_csv)
+
+    def recommend_by_score():
+        # 每次都從 Excel 重算訊號，不使用上一次留下的快取與訊號檔
+        scoring.clear_cache()
+        if os.path.exists(scoring.SIGNALS_FILE):
+            os.remove(scoring.SIGNALS_FILE)
+        core.recommend_by_score()
+
+    return [
+        ("load_draws", core.load_draws),
+        ("load_history_data", lambda: excel.load_history_data()),
+        ("load_history_dataset", lambda: excel.load_history_dataset()),
+        ("analyze_transition_patterns", core.analyze_transition_patterns),
+        ("recommend_by_transition", core.recommend_by_transition),
+        ("recommend_by_score", recommend_by_score),
+        ("generate_stats", core.generate_stats),
+        ("check_hits", check_hits),
+        ("save_to_excel", lambda: core.save_to_excel({9999: [new_record]})),
+    ]
+
+
+def run(sizes, seed=0, only=None, log=print):
+    results = {}
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as workdir, _redirect(workdir):
+            t0 = time.perf_counter()
+            dates, nums = synth.generate_draws(n, seed)
+            synth.write_workbook(core.EXCEL_FILE, dates, nums)
+            _write_history_csv(os.path.join(workdir, "recommend_history.csv"), synth.to_draws(dates, nums))
+            log(f"[{n}] 產生資料 {time.perf_counter() - t0:.2f}s")
+            row = {}
+            for name, func in stages(workdir):
+                if only and name not in only:
+                    continue
+                row[name] = _measure(func)
+                log(f"[{n}] {name}: {row[name]['seconds']}s, {row[name]['peak_mb']} MB")
+            results[str(n)] = row
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """回傳退步清單：[(期數, 階段, 基準秒數, 目前秒數), ...]"""
+    regressions = []
+    for size, row in current["results"].items():
+        for stage, m in row.items():
+            b = baseline.get("results", {}).get(size, {}).get(stage)
+            if not b or "seconds" not in b or "seconds" not in m:
+                continue
+            if b["seconds"] >= MIN_SECONDS and m["seconds"] > b["seconds"] * threshold:
+                regressions.append((int(size), stage, b["seconds"], m["seconds"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="今彩539 處理流程效能量測")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", help="只跑指定階段，以逗號分隔")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--baseline", help="比較用的基準結果 JSON")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    only = set(args.stages.split(",")) if args.stages else None
+    current = run(sizes, args.seed, only)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(current, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.threshold)
+        for size, stage, before, after in regressions:
+            print(f"⚠️ 退步：{size} 期 {stage} {before}s → {after}s")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,180 @@
+# charts.py
+#
+# 無頭（headless）圖表產生：一律使用 Agg 後端與 matplotlib.figure.Figure，
+# 不經過 pyplot，也不呼叫 plt.show()，可在伺服器、Streamlit 與 Tk 主迴圈外安全執行。
+# 產出的 PNG/SVG 以「資料切片 + 圖表參數」的雜湊值快取，相同輸入直接回傳舊檔。
+# 快取資料夾有上限：超過 CACHE_MAX_AGE 秒未使用的檔案會刪除，總大小超過 CACHE_MAX_BYTES 時從最久未用的刪起。
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+import numpy as np
+
+import perf
+
+from main_module import draw_matrix
+
+CACHE_DIR = os.environ.get("CHART_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "539_charts")
+FORMATS = ("png", "svg")
+CACHE_MAX_BYTES = 100 * 2**20       # 100 MB
+CACHE_MAX_AGE = 30 * 86400          # 30 天
+
+
+def _cache_key(kind, arrays, params):
+    """以圖表種類、資料內容與參數計算雜湊，作為快取檔名"""
+    h = hashlib.sha1(kind.encode("utf-8"))
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str(a.shape).encode("ascii"))
+        h.update(a.tobytes())
+    h.update(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _evict(cache_dir, keep):
+    """依最後使用時間（mtime，命中時會更新）清理快取；keep 為剛產生、不可刪除的檔案"""
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        try:
+            st = os.stat(path)
+        except OSError:            # 其他行程剛好刪除或改名
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - CACHE_MAX_AGE
+    for mtime, size, path in entries:
+        if path == keep or (mtime >= cutoff and total <= CACHE_MAX_BYTES):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        perf.incr("chart.cache_evicted")
+
+
+def _render(kind, arrays, params, draw, fmt="png", cache_dir=None):
+    """
+    共用的快取渲染流程：
+      - 快取命中 → 直接回傳檔案路徑
+      - 未命中 → 建立 Figure，交給 draw(fig) 繪製後存檔
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"不支援的圖檔格式：{fmt}")
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{kind}_{_cache_key(kind, arrays, params)}.{fmt}")
+    if os.path.exists(path):
+        perf.incr("chart.cache_hit")
+        try:
+            os.utime(path)         # 記錄最後使用時間，清理時保留常用的圖
+        except OSError:
+            pass
+        return path
+    perf.incr("chart.cache_miss")
+    with perf.span(f"chart.render.{kind}"):
+        fig = Figure(figsize=params.get("figsize", (10, 5)))
+        draw(fig)
+        fig.tight_layout()
+        # 先寫暫存檔再改名，避免同時重繪時讀到寫一半的圖
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fig.savefig(tmp, format=fmt)
+        os.replace(tmp, path)
+    _evict(cache_dir, path)
+    return path
+
+
+def residue_counts(draws, k=3, r=0):
+    """回傳 (號碼清單, 出現次數清單)：只保留 n % k == r 的號碼"""
+    if k < 1 or not (0 <= r < k):
+        raise ValueError("餘數類別參數錯誤：需 k >= 1 且 0 <= r < k")
+    totals = draw_matrix(draws).sum(axis=0, dtype=np.int64)
+    nums = [n for n in range(1, 40) if n % k == r]
+    return nums, [int(totals[n - 1]) for n in nums]
+
+
+def render_residue_chart(draws, k=3, r=0, fmt="png", cache_dir=None):
+    """畫出「除以 k 餘 r」的號碼出現次數長條圖（k=3, r=0 即 3 的倍數）"""
+    nums, counts = residue_counts(draws, k, r)
+    if k == 3 and r == 0:
+        title = "今彩539 - 3 的倍數號碼出現次數"
+    else:
+        title = f"今彩539 - 除以 {k} 餘 {r} 的號碼出現次數"
+
+    def draw(fig):
+        ax = fig.add_subplot()
+        bars = ax.bar([str(n) for n in nums], counts, color="red")
+        ax.set_title(title)
+        ax.set_xlabel("號碼")
+        ax.set_ylabel("出現次數")
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width() / 2, height + 0.5, str(int(height)),
+                    ha="center", va="bottom", fontsize=9)
+
+    params = {"k": k, "r": r}
+    return _render("residue", [np.asarray(counts, dtype=np.int64)], params, draw, fmt, cache_dir)
+
+
+def frequency_by_year(draws):
+    """回傳 (年份清單, (年數, 39) 出現次數矩陣)"""
+    X = draw_matrix(draws)
+    years = np.array([int(str(d)[:4]) for d, _ in draws], dtype=np.int32)
+    labels = sorted(set(years.tolist()))
+    F = np.zeros((len(labels), 39), dtype=np.int64)
+    for i, y in enumerate(labels):
+        F[i] = X[years == y].sum(axis=0)
+    return labels, F
+
+
+def render_frequency_heatmap(draws, fmt="png", cache_dir=None):
+    """年度 × 號碼的出現次數熱圖"""
+    years, F = frequency_by_year(draws)
+
+    def draw(fig):
+        ax = fig.add_subplot()
+        im = ax.imshow(F, aspect="auto", cmap="Reds")
+        ax.set_title("今彩539 - 各年度號碼出現次數")
+        ax.set_xlabel("號碼")
+        ax.set_ylabel("年度")
+        ax.set_xticks(range(39), [str(n) for n in range(1, 40)], fontsize=7)
+        ax.set_yticks(range(len(years)), [str(y) for y in years])
+        fig.colorbar(im, ax=ax)
+
+    params = {"years": years, "figsize": (12, max(3, 0.4 * len(years) + 2))}
+    return _render("frequency", [F], params, draw, fmt, cache_dir)
+
+
+def transition_matrix(draws):
+    """(39, 39) 轉移次數矩陣：T[i, j] = 號碼 i+1 出現後，下一期出現號碼 j+1 的次數"""
+    X = draw_matrix(draws).astype(np.int32)
+    if len(X) < 2:
+        return np.zeros((39, 39), dtype=np.int32)
+    return X[:-1].T @ X[1:]
+
+
+def render_transition_heatmap(draws, fmt="png", cache_dir=None):
+    """當期號碼 → 下一期號碼的轉移次數熱圖"""
+    T = transition_matrix(draws)
+
+    def draw(fig):
+        ax = fig.add_subplot()
+        im = ax.imshow(T, cmap="viridis")
+        ax.set_title("今彩539 - 號碼轉移次數（當期 → 下一期）")
+        ax.set_xlabel("下一期號碼")
+        ax.set_ylabel("當期號碼")
+        ticks = list(range(0, 39, 2))
+        ax.set_xticks(ticks, [str(t + 1) for t in ticks], fontsize=7)
+        ax.set_yticks(ticks, [str(t + 1) for t in ticks], fontsize=7)
+        fig.colorbar(im, ax=ax)
+
+    params = {"figsize": (9, 8)}
+    return _render("transition", [T], params, draw, fmt, cache_dir)
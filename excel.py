@@ -1,55 +1,150 @@
 # excel.py
 
+import numpy as np
 import pandas as pd
+import perf
 from config import EXCEL_FILE
 
+FEATURES = ['sum', 'span', 'odd_even_ratio', 'prime_count',
+            'high_low_ratio', 'consecutive_pairs', 'gap_mean']
+PRIMES = np.array([2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37])
+
+
+class HistoryDataset:
+    """
+    每期一列的精簡資料集（不建立逐列 dict）：
+      dates   (N,) datetime64[D]
+      nums    (N, 5) uint8，排序後的號碼
+      ints    (N, 4) uint8：sum, span, prime_count, consecutive_pairs
+      ratios  (N, 3) float32：odd_even_ratio, high_low_ratio, gap_mean
+      recent  (N, 39) uint8（window ≥ 256 時 uint16）：過去 window 期（不含當期）各號碼出現次數
+      Y       (N, 39) uint8：當期出現矩陣（多標籤目標），packed() 為 bit-packed 版本
+    training_arrays() 以第 t 期的特徵對應第 t+1 期的 39 碼目標，目標是 Y 的 view。
+    """
+    INT_COLUMNS = ['sum', 'span', 'prime_count', 'consecutive_pairs']
+    RATIO_COLUMNS = ['odd_even_ratio', 'high_low_ratio', 'gap_mean']
+
+    def __init__(self, dates, nums, window=20):
+        nums = np.sort(np.asarray(nums, dtype=np.uint8).reshape(-1, 5), axis=1)
+        n = len(nums)
+        self.window = window
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.nums = nums
+
+        v = nums.astype(np.int16)
+        diffs = np.diff(v, axis=1)
+        odd = (v % 2 == 1).sum(axis=1)
+        highs = (v > 20).sum(axis=1)
+        self.ints = np.empty((n, 4), dtype=np.uint8)
+        self.ints[:, 0] = v.sum(axis=1)
+        self.ints[:, 1] = v[:, 4] - v[:, 0]
+        self.ints[:, 2] = np.isin(v, PRIMES).sum(axis=1)
+        self.ints[:, 3] = (diffs == 1).sum(axis=1)
+        self.ratios = np.empty((n, 3), dtype=np.float32)
+        self.ratios[:, 0] = odd / np.maximum(5 - odd, 1)
+        self.ratios[:, 1] = highs / np.maximum(5 - highs, 1)
+        self.ratios[:, 2] = diffs.mean(axis=1)
+
+        self.Y = np.zeros((n, 39), dtype=np.uint8)
+        self.Y[np.arange(n)[:, None], nums.astype(np.intp) - 1] = 1
+        # 滾動視窗次數：累計和相減，recent[t] = 第 t-window ~ t-1 期的出現次數
+        cum = np.zeros((n + 1, 39), dtype=np.int32)
+        np.cumsum(self.Y, axis=0, out=cum[1:])
+        lo = np.maximum(np.arange(n) - window, 0)
+        self.recent = (cum[:-1] - cum[lo]).astype(np.uint8 if window < 256 else np.uint16)
+
+    def __len__(self):
+        return len(self.nums)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.dates, self.nums, self.ints, self.ratios, self.Y, self.recent))
+
+    def packed(self):
+        """(N, 5) uint8 的 bit-packed 目標；np.unpackbits(p, axis=1, count=39) 還原"""
+        return np.packbits(self.Y, axis=1)
+
+    def design(self, features=None):
+        """
+        (N, F) float32 特徵矩陣；features 為欄位名稱清單（預設 FEATURES + recent_count），
+        'recent_count' 會展開成 39 欄（每個號碼的近期出現次數）。
+        """
+        features = features or FEATURES + ['recent_count']
+        cols = []
+        for name in features:
+            if name == 'recent_count':
+                cols.append(self.recent)
+            elif name in self.INT_COLUMNS:
+                cols.append(self.ints[:, [self.INT_COLUMNS.index(name)]])
+            elif name in self.RATIO_COLUMNS:
+                cols.append(self.ratios[:, [self.RATIO_COLUMNS.index(name)]])
+            else:
+                raise KeyError(f"未知的特徵：{name}")
+        out = np.empty((len(self), sum(c.shape[1] for c in cols)), dtype=np.float32)
+        i = 0
+        for c in cols:
+            out[:, i:i + c.shape[1]] = c
+            i += c.shape[1]
+        return out
+
+    def training_arrays(self, features=None):
+        """(X[:-1], Y[1:])：以每一期的特徵預測下一期 39 碼；Y 為 view 不複製"""
+        return self.design(features)[:-1], self.Y[1:]
+
+    def latest(self, features=None):
+        """最近一期的特徵 (1, F)，用來預測尚未開出的下一期"""
+        return self.design(features)[-1:]
+
+    def frame(self):
+        """每期一列的 DataFrame（compact dtypes）"""
+        df = pd.DataFrame({'date': self.dates})
+        for i, name in enumerate(self.INT_COLUMNS):
+            df[name] = self.ints[:, i]
+        for i, name in enumerate(self.RATIO_COLUMNS):
+            df[name] = self.ratios[:, i]
+        return df
+
+    def long_frame(self):
+        """舊版長格式：每期 5 列（每列一個號碼 + 該期特徵 + 該號碼的 recent_count）"""
+        rows = np.repeat(np.arange(len(self)), 5)
+        number = self.nums.ravel()
+        df = pd.DataFrame({'number': number})
+        for i, name in enumerate(self.INT_COLUMNS):
+            df[name] = self.ints[rows, i]
+        for i, name in enumerate(self.RATIO_COLUMNS):
+            df[name] = self.ratios[rows, i]
+        df['recent_count'] = self.recent[rows, number.astype(np.intp) - 1]
+        return df[['number'] + FEATURES + ['recent_count']]
+
+
+def _read_draws():
+    from openpyxl import load_workbook
+    import main_module as core
+    with perf.span("excel.load"):
+        wb = load_workbook(EXCEL_FILE, read_only=True)
+    try:
+        return core.load_draws(wb)
+    finally:
+        wb.close()
+
+
+@perf.timed("load_history_dataset")
+def load_history_dataset(window=20, draws=None):
+    """讀取 EXCEL_FILE（或傳入的 [(日期, 號碼們), ...]）建立每期一列的 HistoryDataset"""
+    draws = draws if draws is not None else _read_draws()
+    dates = [d for d, _ in draws]
+    nums = [list(n) for _, n in draws]
+    return HistoryDataset(dates, nums, window)
+
+
+@perf.timed("load_history_data")
 def load_history_data(window=20):
     """
     讀取 EXCEL_FILE 中所有年度分頁，把開獎號碼攤平成 DataFrame，
     並計算各種統計特徵：
       - sum, span, odd_even_ratio, prime_count, high_low_ratio, consecutive_pairs, gap_mean
       - recent_count: 過去 window 期內該號碼出現次數
-    最後回傳長格式（每一列是一個號碼 + 該行所有特徵）。
+    最後回傳長格式（每一列是一個號碼 + 該行所有特徵）；欄位為 uint8 / float32。
+    新程式請改用 load_history_dataset()（每期一列、多標籤目標）。
     """
-    # 讀所有分頁
-    all_sheets = pd.read_excel(EXCEL_FILE, sheet_name=None)
-    history = []
-    for name, df in all_sheets.items():
-        if name.isdigit():
-            # 假設第一欄是日期，其後 5 欄是號碼
-            for _, row in df.iterrows():
-                nums = list(row.iloc[1:6])
-                history.append(nums)
-    # 轉成 DataFrame
-    df = pd.DataFrame(history, columns=['n1','n2','n3','n4','n5'])
-    # 展平
-    records = []
-    prime_set = {2,3,5,7,11,13,17,19,23,29,31,37}
-    for idx, row in df.iterrows():
-        nums = row.values.tolist()
-        s = sum(nums)
-        sp = max(nums)-min(nums)
-        odd = sum(n%2==1 for n in nums)
-        even = 5-odd
-        primes = sum(n in prime_set for n in nums)
-        highs = sum(n>20 for n in nums)
-        lows = 5-highs
-        consec = sum(1 for i in range(4) if abs(nums[i+1]-nums[i])==1)
-        gaps = [abs(nums[i+1]-nums[i]) for i in range(4)]
-        gap_mean = sum(gaps)/len(gaps)
-        # 過去 window 期 recent_count
-        recent_slice = df.iloc[max(0, idx-window):idx]
-        flat = recent_slice.values.flatten().tolist()
-        for num in nums:
-            records.append({
-                'number': num,
-                'sum': s,
-                'span': sp,
-                'odd_even_ratio': odd/(even or 1),
-                'prime_count': primes,
-                'high_low_ratio': highs/(lows or 1),
-                'consecutive_pairs': consec,
-                'gap_mean': gap_mean,
-                'recent_count': flat.count(num)
-            })
-    return pd.DataFrame(records)
+    return load_history_dataset(window).long_frame()
@@ -0,0 +1,108 @@
+# gaps.py
+#
+# 號碼遺漏（gap / overdue）統計，39 個號碼各自維護：
+#   - 目前遺漏：距離上次開出已經過幾期（最新一期有開出則為 0）
+#   - 最大遺漏：歷史上兩次開出之間相隔的最多期數
+#   - 遺漏分布：各遺漏期數出現的次數（超過 MAX_GAP 併入最後一格）
+# 全量重建以出現矩陣做向量化 diff；之後每加入一期只需更新該期 5 個號碼。
+
+import numpy as np
+
+from main_module import draw_matrix
+
+MAX_GAP = 100
+
+
+class GapTracker:
+    def __init__(self, max_gap=MAX_GAP):
+        self.max_gap = max_gap
+        self.count = 0                                   # 已處理期數
+        self.last_seen = np.full(39, -1, dtype=np.int64)  # 最後開出的期數索引，-1 表示未開出
+        self.max_gaps = np.zeros(39, dtype=np.int64)
+        self.hist = np.zeros((39, max_gap + 1), dtype=np.int64)
+
+    @classmethod
+    def from_matrix(cls, X, max_gap=MAX_GAP):
+        """由 (期數, 39) 出現矩陣一次建立"""
+        return cls(max_gap).extend(X)
+
+    def extend(self, X):
+        """
+        加入一段 (期數, 39) 出現矩陣（向量化），可分段呼叫，例如逐年加入；
+        每個號碼前一段最後開出的位置會接在本段之前一起計算遺漏。
+        """
+        X = np.asarray(X)
+        # 依號碼、期數排序的所有開出位置（含前一段的最後位置）
+        cols, rows = np.nonzero(X.T)
+        rows = rows + self.count
+        seen = np.flatnonzero(self.last_seen >= 0)
+        cols = np.concatenate([seen, cols])
+        rows = np.concatenate([self.last_seen[seen], rows])
+        order = np.lexsort((rows, cols))
+        cols, rows = cols[order], rows[order]
+        if len(rows):
+            same = cols[1:] == cols[:-1]
+            gap_cols = cols[1:][same]
+            gaps = np.diff(rows)[same] - 1
+            np.add.at(self.hist, (gap_cols, np.minimum(gaps, self.max_gap)), 1)
+            np.maximum.at(self.max_gaps, gap_cols, gaps)
+            # 每個號碼最後一次出現的位置：同號碼的最後一筆
+            last = np.ones(len(cols), dtype=bool)
+            last[:-1] = cols[1:] != cols[:-1]
+            self.last_seen[cols[last]] = rows[last]
+        self.count += len(X)
+        return self
+
+    @classmethod
+    def from_draws(cls, draws, max_gap=MAX_GAP):
+        return cls.from_matrix(draw_matrix(draws), max_gap)
+
+    def append(self, nums):
+        """加入新的一期，只更新開出的號碼"""
+        for n in nums:
+            k = int(n) - 1
+            if self.last_seen[k] >= 0:
+                gap = self.count - self.last_seen[k] - 1
+                self.hist[k, min(gap, self.max_gap)] += 1
+                if gap > self.max_gaps[k]:
+                    self.max_gaps[k] = gap
+            self.last_seen[k] = self.count
+        self.count += 1
+
+    def current_gaps(self):
+        """(39,) 目前遺漏期數；從未開出的號碼視為遺漏全部期數"""
+        return np.where(self.last_seen >= 0, self.count - 1 - self.last_seen, self.count)
+
+    def mean_gaps(self):
+        """(39,) 歷史平均遺漏（分布中超過 MAX_GAP 的部分以 MAX_GAP 計）"""
+        totals = self.hist.sum(axis=1)
+        weighted = self.hist @ np.arange(self.max_gap + 1)
+        return np.divide(weighted, totals, out=np.full(39, np.nan), where=totals > 0)
+
+    def exceed_ratio(self):
+        """(39,) 歷史遺漏中，長度不小於目前遺漏的比例；越小代表目前越「冷」"""
+        cur = np.minimum(self.current_gaps(), self.max_gap)
+        tail = np.cumsum(self.hist[:, ::-1], axis=1)[:, ::-1]   # tail[k, g] = 遺漏 >= g 的次數
+        totals = self.hist.sum(axis=1)
+        return np.divide(tail[np.arange(39), cur], totals, out=np.ones(39), where=totals > 0)
+
+    def scores(self):
+        """(39,) 推薦分數：目前遺漏 / 平均遺漏，越大代表越久未開出"""
+        mean = self.mean_gaps()
+        cur = self.current_gaps().astype(float)
+        return np.where(np.isnan(mean), 0.0, cur / np.maximum(np.nan_to_num(mean), 1.0))
+
+    def table(self):
+        """回傳每個號碼一列的 dict 清單，方便轉成 DataFrame 顯示"""
+        cur, mean, ratio, score = self.current_gaps(), self.mean_gaps(), self.exceed_ratio(), self.scores()
+        rows = []
+        for k in range(39):
+            rows.append({
+                "號碼": k + 1,
+                "目前遺漏": int(cur[k]),
+                "最大遺漏": int(max(self.max_gaps[k], cur[k])),
+                "平均遺漏": None if np.isnan(mean[k]) else round(float(mean[k]), 2),
+                "歷史遺漏≥目前比例": round(float(ratio[k]), 3),
+                "遺漏指數": round(float(score[k]), 2),
+            })
+        return rows
@@ -0,0 +1,172 @@
+# higher_order.py
+#
+# 高階（以號碼組合為條件）的轉移模型：
+#   - mode="within"：以上一期 5 碼中任取 order 個號碼的組合為條件（order=2 → 每期 10 組號碼對）
+#   - mode="across"：以「前兩期各取一碼」的號碼對為條件（上上期 a、上一期 b，每期 25 組）
+# 只儲存實際出現過的條件組合：key → 該列在 counts (K, 39) 中的位置，
+# 記憶體與觀察到的組合數成正比，不需配置完整的 C(39, order) × 39 表；可用 max_keys 設上限。
+
+import numpy as np
+from itertools import combinations
+
+CHUNK = 50_000
+
+
+def _as_array(draws):
+    """[(日期, 號碼們), ...] 或 (N, 5) 陣列 → 排序好的 (N, 5) int64 陣列"""
+    if isinstance(draws, np.ndarray):
+        return np.sort(draws.astype(np.int64), axis=1)
+    return np.sort(np.array([list(nums) for _, nums in draws], dtype=np.int64).reshape(-1, 5), axis=1)
+
+
+class HigherOrderTransitions:
+    def __init__(self, order=2, mode="within", max_keys=None):
+        if mode not in ("within", "across"):
+            raise ValueError(f"未知的 mode：{mode}")
+        if mode == "within" and not 1 <= order <= 5:
+            raise ValueError("order 必須介於 1~5")
+        if mode == "across" and order != 2:
+            raise ValueError("mode=\"across\" 只支援 order=2（前兩期各取一碼）")
+        self.order = order
+        self.mode = mode
+        self.max_keys = max_keys
+        self._index = {}                                  # key -> counts 列號
+        self._counts = np.zeros((64, 39), dtype=np.int32)
+        self._size = 0
+        self._sorted = None                               # 批次查詢用 (排序後 keys, 對應列號)
+        self._recent = []                                 # 增量更新用：最近兩期
+        self._combos = np.array(list(combinations(range(5), self.order)), dtype=np.intp)
+
+    # ---------- 條件組合的編碼 ----------
+
+    def _keys(self, prev2, prev1):
+        """
+        回傳 (M, S) 的 int64 key：
+          - within：子集合的位元遮罩（號碼 n → 第 n-1 位元）
+          - across：(a-1) * 39 + (b-1)
+        """
+        if self.mode == "within":
+            bits = np.left_shift(np.int64(1), prev1 - 1)
+            return bits[:, self._combos].sum(axis=2)
+        a = prev2[:, :, None] - 1
+        b = prev1[:, None, :] - 1
+        return (a * 39 + b).reshape(len(prev1), 25)
+
+    @property
+    def history(self):
+        """計算 key 需要的期數：within 只看上一期，across 需要前兩期"""
+        return 1 if self.mode == "within" else 2
+
+    # ---------- 建立 / 更新 ----------
+
+    def _rows_for(self, keys):
+        """把 key 陣列轉成 counts 列號，未見過的 key 新增一列"""
+        uniq, inv = np.unique(keys, return_inverse=True)
+        rows = np.empty(len(uniq), dtype=np.intp)
+        for i, k in enumerate(uniq.tolist()):
+            r = self._index.get(k)
+            if r is None:
+                r = self._index[k] = self._size
+                self._size += 1
+                if self._size > len(self._counts):
+                    grown = np.zeros((len(self._counts) * 2, 39), dtype=np.int32)
+                    grown[:len(self._counts)] = self._counts
+                    self._counts = grown
+            rows[i] = r
+        self._sorted = None
+        return rows[inv]
+
+    def _accumulate(self, nums):
+        """以 nums 中相鄰各期累加轉移次數（向量化，不處理跨批次邊界）"""
+        h = self.history
+        if len(nums) <= h:
+            return
+        prev2 = nums[:-2] if h == 2 else None
+        prev1 = nums[h - 1:-1]
+        nxt = nums[h:]
+        keys = self._keys(prev2, prev1)                            # (M, S)
+        S = keys.shape[1]
+        rows = self._rows_for(keys.ravel()).reshape(-1, S)         # (M, S)
+        # 每個 (期, 條件組合) 對上該期的 5 個下一期號碼
+        r = np.repeat(rows, 5, axis=1).ravel()
+        c = np.broadcast_to((nxt - 1)[:, None, :], (len(nxt), S, 5)).ravel()
+        flat = np.bincount(r * 39 + c, minlength=self._size * 39)
+        self._counts[:self._size] += flat.reshape(self._size, 39).astype(np.int32)
+
+    def fit(self, draws):
+        """從頭建立；draws 為 [(日期, 號碼們), ...] 或 (N, 5) 陣列"""
+        nums = _as_array(draws)
+        self.__init__(self.order, self.mode, self.max_keys)
+        h = self.history
+        for lo in range(0, len(nums), CHUNK):
+            # 每批往前多帶 h 期，讓批次邊界的轉移也被計入
+            self._accumulate(nums[max(0, lo - h):lo + CHUNK])
+            self._prune()
+        self._recent = [list(r) for r in nums[-h:].tolist()]
+        return self
+
+    def update(self, nums):
+        """加入新的一期（增量更新）"""
+        nums = sorted(int(n) for n in nums)
+        if len(self._recent) == self.history:
+            self._accumulate(np.array(self._recent + [nums], dtype=np.int64))
+            self._prune()
+        self._recent = (self._recent + [nums])[-self.history:]
+
+    def _prune(self):
+        """超過 max_keys 時只保留總次數最高的 3/4，避免記憶體無限成長"""
+        if not self.max_keys or self._size <= self.max_keys:
+            return
+        keep_n = self.max_keys * 3 // 4
+        totals = self._counts[:self._size].sum(axis=1)
+        keep = np.sort(np.argsort(-totals, kind="stable")[:keep_n])
+        keys = np.empty(self._size, dtype=np.int64)
+        for k, r in self._index.items():
+            keys[r] = k
+        self._counts = np.ascontiguousarray(self._counts[keep])
+        self._index = {int(k): i for i, k in enumerate(keys[keep].tolist())}
+        self._size = len(keep)
+        self._sorted = None
+
+    # ---------- 查詢 ----------
+
+    def _lookup(self, keys):
+        """批次查詢：回傳 keys 對應的列號，未見過的為 -1"""
+        if self._sorted is None:
+            ks = np.fromiter(self._index.keys(), dtype=np.int64, count=len(self._index))
+            rs = np.fromiter(self._index.values(), dtype=np.intp, count=len(self._index))
+            order = np.argsort(ks)
+            self._sorted = (ks[order], rs[order])
+        ks, rs = self._sorted
+        if not len(ks):
+            return np.full(keys.shape, -1, dtype=np.intp)
+        pos = np.minimum(np.searchsorted(ks, keys), len(ks) - 1)
+        return np.where(ks[pos] == keys, rs[pos], -1)
+
+    def score_batch(self, bases):
+        """
+        bases：within 為 (M, 5) 上一期號碼；across 為 (M, 2, 5)（上上期, 上一期）。
+        回傳 (M, 39) 分數：所有條件組合的下一期次數加總。
+        """
+        bases = np.asarray(bases, dtype=np.int64)
+        if self.mode == "within":
+            keys = self._keys(None, np.sort(bases, axis=1))
+        else:
+            keys = self._keys(bases[:, 0], bases[:, 1])
+        rows = self._lookup(keys)
+        counts = np.vstack([self._counts[:self._size], np.zeros((1, 39), dtype=np.int32)])
+        return counts[rows].sum(axis=1, dtype=np.int64)     # -1 對應到最後一列的 0
+
+    def score(self, base=None):
+        """單筆分數 (39,)；未給 base 時使用 fit/update 看到的最後一(兩)期"""
+        if base is None:
+            base = self._recent if self.mode == "across" else self._recent[-1]
+        return self.score_batch([base])[0]
+
+    @property
+    def n_keys(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return self._counts[:self._size].nbytes
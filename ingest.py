@@ -0,0 +1,229 @@
+# ingest.py
+#
+# 匯入大量歷史開獎檔（不需網路）：
+#   - 支援 CSV、xlsx（與 539_by_year.xlsx 相同版面）、官方 API 的 JSON 回應
+#   - 多個檔案以行程池平行解析
+#   - 每列驗證：日期有效、5 個不重複且介於 1~39 的整數；不合格的列寫入退件報告
+#   - 以日期索引去除重複（既有資料與匯入檔之間、匯入檔彼此之間），合併後一次依日期排序寫回
+#   - 既有 Excel 中有無法解析的列時不寫回（整份重寫會遺失這些列），改列入退件報告
+#
+# 執行：python main_module.py import a.csv b.xlsx c.json [--rejects rejects.csv] [--dry-run]
+
+import os
+import csv
+import json
+import re
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+
+import main_module as core
+import perf
+
+REJECT_COLUMNS = ["檔案", "位置", "內容", "原因"]
+
+
+def validate(raw_date, raw_nums):
+    """回傳 (日期字串, 排序後號碼) 或丟出 ValueError(原因)"""
+    d = core.parse_date(raw_date.isoformat() if isinstance(raw_date, date) else raw_date)
+    if d is None:
+        raise ValueError("日期格式錯誤")
+    try:
+        date.fromisoformat(d)
+    except ValueError:
+        raise ValueError("日期不存在")
+    nums = []
+    for v in raw_nums:
+        if isinstance(v, bool):
+            raise ValueError("號碼不是整數")
+        if isinstance(v, float) and v.is_integer():
+            v = int(v)
+        if isinstance(v, str) and v.strip().isdigit():
+            v = int(v)
+        if not isinstance(v, int):
+            raise ValueError("號碼不是整數")
+        nums.append(v)
+    if len(nums) != 5:
+        raise ValueError("號碼數量不是 5 個")
+    if any(not 1 <= n <= 39 for n in nums):
+        raise ValueError("號碼超出 1~39")
+    if len(set(nums)) != 5:
+        raise ValueError("號碼重複")
+    return d, sorted(nums)
+
+
+def _split_nums(fields):
+    """CSV 的號碼欄可能是 5 欄，也可能是單一欄位 "1,2,3,4,5" / "01 02 03 04 05" """
+    if len(fields) == 1:
+        return [t for t in re.split(r"[,\s]+", fields[0].strip()) if t]
+    return fields
+
+
+# 各讀取器 yield (是否為該檔/分頁的第一列, 位置, 原始內容, 日期欄, 號碼欄們)
+
+def _iter_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        first = True
+        for i, row in enumerate(csv.reader(f), start=1):
+            if row and any(c.strip() for c in row):
+                yield first, f"第 {i} 列", row, row[0], _split_nums(row[1:])
+                first = False
+
+
+def _iter_xlsx(path):
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True)
+    try:
+        for ws in wb.worksheets:
+            first = True
+            for i, row in enumerate(ws.iter_rows(values_only=True), start=1):
+                if row and any(v is not None for v in row):
+                    nums = list(row[1:])
+                    while nums and nums[-1] is None:
+                        nums.pop()
+                    yield first, f"{ws.title}!{i}", list(row), row[0], nums
+                    first = False
+    finally:
+        wb.close()
+
+
+def _iter_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    pages = data if isinstance(data, list) else [data]
+    for p, page in enumerate(pages):
+        records = page.get("content", {}).get("daily539Res", []) if isinstance(page, dict) and "content" in page else [page]
+        for i, r in enumerate(records):
+            if not isinstance(r, dict):
+                yield False, f"[{p}][{i}]", r, None, []
+                continue
+            yield False, f"[{p}][{i}]", r, r.get("lotteryDate"), r.get("drawNumberSize") or []
+
+
+def _looks_like_header(raw_date, raw_nums):
+    """第一列沒有可解析的日期、也沒有任何數字欄位 → 視為表頭"""
+    if isinstance(raw_date, date) or core.parse_date(str(raw_date or "")) is not None:
+        return False
+    return not any(isinstance(v, (int, float)) or str(v).strip().isdigit() for v in raw_nums)
+
+
+READERS = {".csv": _iter_csv, ".xlsx": _iter_xlsx, ".json": _iter_json}
+
+
+def parse_file(path):
+    """
+    解析單一檔案，回傳 (合格列 [(日期, 號碼)], 退件列 [(檔案, 位置, 內容, 原因)])。
+    只有每個檔案 / 分頁的第一列可被當成表頭略過，其餘無法解析的列一律退件。
+    """
+    ext = os.path.splitext(path)[1].lower()
+    reader = READERS.get(ext)
+    if reader is None:
+        return [], [(path, "-", "", f"不支援的檔案格式：{ext}")]
+    rows, rejects = [], []
+    try:
+        for first, where, raw, raw_date, raw_nums in reader(path):
+            try:
+                rows.append(validate(raw_date, raw_nums))
+            except ValueError as e:
+                if first and _looks_like_header(raw_date, raw_nums):
+                    continue
+                rejects.append((path, where, json.dumps(raw, ensure_ascii=False, default=str), str(e)))
+    except Exception as e:      # 檔案本身無法讀取（格式損毀等），整個檔案退件
+        rejects.append((path, "-", "", f"無法讀取：{type(e).__name__}: {e}"))
+    return rows, rejects
+
+
+def load_existing():
+    """
+    讀取既有 EXCEL_FILE，回傳 (load_draws() 的結果, 無法解析的列)。
+    無法解析的列是年度分頁中有內容、但 load_draws() 會略過的資料列；
+    write_draws() 整份重寫時這些列會消失，因此以退件格式回報。
+    """
+    if not os.path.exists(core.EXCEL_FILE):
+        return [], []
+    from openpyxl import load_workbook
+    with perf.span("excel.load"):
+        wb = load_workbook(core.EXCEL_FILE, read_only=True)
+    try:
+        draws = core.load_draws(wb)
+        unreadable = []
+        for name in sorted(wb.sheetnames):
+            if not name.isdigit():
+                continue
+            for i, row in enumerate(wb[name].iter_rows(min_row=2, values_only=True), start=2):
+                if not row or all(v is None for v in row):
+                    continue
+                if not (row[0] and all(isinstance(n, int) for n in row[1:6])):
+                    unreadable.append((core.EXCEL_FILE, f"{name}!{i}", json.dumps(list(row), ensure_ascii=False, default=str),
+                                       "既有資料無法解析，重寫 Excel 會遺失此列"))
+    finally:
+        wb.close()
+    return draws, unreadable
+
+
+def merge(existing, parsed):
+    """
+    以日期索引合併。回傳 (新增的期數, 退件)；
+    同一天已存在且號碼相同 → 略過；號碼不同 → 退件（不覆蓋既有資料）。
+    """
+    index = {d: sorted(nums) for d, nums in existing}
+    added, rejects = {}, []
+    for path, rows in parsed:
+        for d, nums in rows:
+            known = index.get(d) or added.get(d)
+            if known is None:
+                added[d] = nums
+            elif known != nums:
+                rejects.append((path, d, json.dumps(nums), f"與既有資料衝突：{d} 已是 {known}"))
+    return sorted(added.items()), rejects
+
+
+def write_rejects(path, rejects):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(REJECT_COLUMNS)
+        writer.writerows(rejects)
+
+
+@perf.timed("import_archives")
+def import_archives(paths, rejects_path=None, dry_run=False, workers=None):
+    """
+    匯入多個歷史檔。回傳摘要 dict：
+      {"files", "parsed", "added", "duplicates", "rejected", "unreadable_existing",
+       "first_added", "last_added", "rejects_file", "dry_run"}
+    既有 Excel 有無法解析的列時不寫回，摘要另含 "error"（這些列會列入退件報告）。
+    """
+    if len(paths) > 1 and (workers is None or workers > 1):
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_file, paths))
+    else:
+        results = [parse_file(p) for p in paths]
+
+    rejects = [r for _, rej in results for r in rej]
+    parsed = [(p, rows) for p, (rows, _) in zip(paths, results)]
+    n_parsed = sum(len(rows) for _, rows in parsed)
+    existing, unreadable = load_existing()
+    added, conflicts = merge(existing, parsed)
+    rejects += conflicts + unreadable
+
+    error = None
+    if added and unreadable:
+        error = f"既有 Excel 有 {len(unreadable)} 列無法解析，寫回會遺失這些列，已停止匯入；請先修正後再匯入"
+    elif added and not dry_run:
+        core.write_draws(sorted(existing + added))
+    if rejects and rejects_path:
+        write_rejects(rejects_path, rejects)
+    summary = {
+        "files": len(paths),
+        "parsed": n_parsed,
+        "added": len(added),
+        "duplicates": n_parsed - len(added) - len(conflicts),
+        "rejected": len(rejects),
+        "unreadable_existing": len(unreadable),
+        "first_added": added[0][0] if added else None,
+        "last_added": added[-1][0] if added else None,
+        "rejects_file": rejects_path if rejects and rejects_path else None,
+        "dry_run": dry_run,
+    }
+    if error:
+        summary["error"] = error
+    return summary
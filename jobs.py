@@ -0,0 +1,109 @@
+# jobs.py
+#
+# 共用的背景工作執行器：
+#   - 長時間工作（抓資料、寫 Excel、轉移分析）丟到共用的執行緒池
+#   - 同一個 key 的工作正在執行時，再次送出會直接加入既有工作（single-flight），不會重複執行
+#   - 工作函式以第一個參數收到 Job，可呼叫 job.report() 回報進度；被取消時 report() 會丟出 JobCancelled
+#   - 不同 key 但會寫同一份檔案的工作以 exclusive(lock, func) 包裝，一次只執行一個
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.progress = 0.0
+        self.message = ""
+        self.started = time.time()
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def report(self, done, total, message=""):
+        """回報進度（done / total）；若工作已被要求取消則丟出 JobCancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled(self.key)
+        self.progress = min(1.0, done / total) if total else 0.0
+        self.message = message
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    @property
+    def error(self):
+        return self.future.exception() if self.done else None
+
+
+def exclusive(lock, func, message="等待其他工作完成…"):
+    """
+    包裝工作函式：取得 lock 後才執行 func(job, ...)。
+    用於會讀寫同一份檔案的工作（例如共用 core.workbook_lock），等待期間仍可被取消。
+    """
+    def run(job, *args, **kwargs):
+        while not lock.acquire(timeout=0.2):
+            job.report(0, 1, message)
+        try:
+            return func(job, *args, **kwargs)
+        finally:
+            lock.release()
+    return run
+
+
+class JobManager:
+    def __init__(self, max_workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="539-job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, key, func, *args, **kwargs):
+        """
+        送出工作；同一個 key 的工作尚未完成時直接回傳該工作（single-flight）。
+        func 會以 func(job, *args, **kwargs) 呼叫。
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                return job
+            job = Job(key)
+
+            def run():
+                try:
+                    return func(job, *args, **kwargs)
+                finally:
+                    job.finished = time.time()
+
+            job.future = self._pool.submit(run)
+            self._jobs[key] = job
+            return job
+
+    def get(self, key):
+        """回傳該 key 最近一次的工作（可能已完成），沒有則為 None"""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def running(self, key):
+        job = self.get(key)
+        return job is not None and not job.done
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            for job in self._jobs.values():
+                job.cancel()
+        self._pool.shutdown(wait=wait)
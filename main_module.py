@@ -2,13 +2,20 @@
 import os
 import sys
 import json
-import requests
 import re
+import csv
+import time
+import logging
+import argparse
+import threading
+from bisect import bisect_right
 from datetime import datetime
 from collections import Counter, defaultdict
-from openpyxl import Workbook, load_workbook
-from openpyxl.styles import Font
-import matplotlib.pyplot as plt
+
+import perf
+
+# requests / openpyxl / matplotlib 較重，一律在用到的函式內才 import，
+# 讓 `python main_module.py recommend` 這類輕量指令可以快速啟動。
 
 def get_app_path():
     if getattr(sys, 'frozen', False):
@@ -17,9 +24,6 @@ def get_app_path():
 
 app_dir = get_app_path()
 config_path = os.path.join(app_dir, "config.json")
-
-app_dir = os.path.dirname(os.path.abspath(__file__))
-config_path = os.path.join(app_dir, "config.json")
 with open(config_path, "r", encoding="utf-8") as f:
     config = json.load(f)
 
@@ -31,41 +35,67 @@ ENABLE_CHART = config.get("enable_chart", False)
 EXCEL_FILE = os.path.join(app_dir, "539_by_year.xlsx")
 TRANSITION_FILE = os.path.join(app_dir, "539_transition_analysis.txt")
 CHART_FILE = os.path.join(app_dir, "539_multiples_of_3_chart.png")
+LATEST_FILE = os.path.join(app_dir, "539_latest_draw.json")
+STARTUP_BUDGET_MS = config.get("startup_budget_ms", 150)
+API_URL = config.get("api_url", "https://api.taiwanlottery.com/TLCAPIWeB/Lottery/Daily539Result")
+
+log = logging.getLogger("539")
+
+# 同一行程內讀寫 EXCEL_FILE 的背景工作共用這把鎖（見 jobs.exclusive），
+# 避免兩個工作同時「讀入 → 修改 → 存檔」互相覆蓋對方的變更
+workbook_lock = threading.RLock()
+
+def _fetch_month(month_str):
+    """抓取某月份的開獎清單；網路或回應格式錯誤時記錄 log 並回傳 None"""
+    import requests
+    url = f"{API_URL}?period&month={month_str}&pageNum=1&pageSize=50"
+    with perf.span("http.fetch"):
+        try:
+            res = requests.get(url, verify=False)
+            res.raise_for_status()
+            perf.incr("http.calls")
+            perf.incr("http.bytes", len(res.content))
+            return res.json()['content']['daily539Res']
+        except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+            perf.incr("http.errors")
+            log.warning("抓取 %s 失敗：%s", month_str, e)
+            return None
 
 def fetch_data(year, month):
-    month_str = f"{year}-{month:02d}"
-    url = f"https://api.taiwanlottery.com/TLCAPIWeB/Lottery/Daily539Result?period&month={month_str}&pageNum=1&pageSize=50"
-    try:
-        res = requests.get(url, verify=False)
-        res.raise_for_status()
-        return res.json()['content']['daily539Res']
-    except:
-        return []
+    return _fetch_month(f"{year}-{month:02d}") or []
 
-def fetch_today_data():
-    today = datetime.today()
-    month_str = today.strftime("%Y-%m")
+def fetch_today_data(today=None):
+    today = today or datetime.today()
     date_str = today.strftime("%Y-%m-%d")
-    url = f"https://api.taiwanlottery.com/TLCAPIWeB/Lottery/Daily539Result?period&month={month_str}&pageNum=1&pageSize=50"
-    try:
-        res = requests.get(url, verify=False)
-        res.raise_for_status()
-        for r in res.json()['content']['daily539Res']:
-            if r['lotteryDate'].startswith(date_str):
-                return r
-    except:
-        return None
+    for r in _fetch_month(today.strftime("%Y-%m")) or []:
+        if r['lotteryDate'].startswith(date_str):
+            return r
+    return None
 
 def prepare_workbook():
+    from openpyxl import Workbook, load_workbook
     if os.path.exists(EXCEL_FILE):
-        return load_workbook(EXCEL_FILE)
+        with perf.span("excel.load"):
+            return load_workbook(EXCEL_FILE)
     wb = Workbook()
     wb.remove(wb.active)
     return wb
 
+def save_workbook(wb):
+    """把 wb 存回 EXCEL_FILE：先寫暫存檔再取代，讀取端不會讀到寫一半的檔案"""
+    tmp = f"{EXCEL_FILE}.{os.getpid()}.tmp"
+    try:
+        with perf.span("excel.save"):
+            wb.save(tmp)
+        os.replace(tmp, EXCEL_FILE)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
 def get_existing_dates(ws):
     return set(str(row[0]) for row in ws.iter_rows(min_row=2, values_only=True) if row[0])
 
+@perf.timed("save_to_excel")
 def save_to_excel(records_by_year):
     wb = prepare_workbook()
     for year, records in records_by_year.items():
@@ -81,15 +111,47 @@ def save_to_excel(records_by_year):
             date = r['lotteryDate'].split("T")[0]
             if date not in existing_dates:
                 ws.append([date] + r['drawNumberSize'])
-    wb.save(EXCEL_FILE)
+                perf.incr("excel.rows_appended")
+    save_workbook(wb)
+    write_latest_draw(load_draws(wb))
+
+@perf.timed("write_draws")
+def write_draws(draws):
+    """
+    以 [(日期, 號碼們), ...]（需已依日期排序）整份重寫 EXCEL_FILE，每年一個分頁。
+    以 write_only 串流寫到暫存檔後再取代，寫入中途失敗不會損毀原檔。
+    """
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws, current = None, None
+    for date, nums in draws:
+        year = str(date)[:4]
+        if year != current:
+            ws = wb.create_sheet(title=year)
+            ws.append(["開獎日", "號碼1", "號碼2", "號碼3", "號碼4", "號碼5"])
+            current = year
+        ws.append([date] + list(nums))
+    save_workbook(wb)
+    write_latest_draw(draws)
 
-def update_history():
+def update_history(start_year=None, end_year=None, months=None, progress=None):
+    """
+    依設定年份/月份抓取歷史資料並寫入 Excel。
+    未指定的參數使用 config；progress(done, total, message) 會在每個月份抓取前被呼叫。
+    """
+    start_year = start_year or START_YEAR
+    end_year = end_year or END_YEAR
+    months = months or MONTHS
+    periods = [(y, m) for y in range(start_year, end_year + 1) for m in months]
     records_by_year = {}
-    for year in range(START_YEAR, END_YEAR + 1):
-        for month in MONTHS:
-            records = fetch_data(year, month)
-            if records:
-                records_by_year.setdefault(year, []).extend(records)
+    for i, (year, month) in enumerate(periods):
+        if progress:
+            progress(i, len(periods), f"{year}-{month:02d}")
+        records = fetch_data(year, month)
+        if records:
+            records_by_year.setdefault(year, []).extend(records)
+    if progress:
+        progress(len(periods), len(periods), "寫入 Excel")
     save_to_excel(records_by_year)
 
 def update_today():
@@ -103,59 +165,86 @@ def update_today():
 def is_multiple_of_3(n):
     return n % 3 == 0
 
-def generate_stats():
-    wb = load_workbook(EXCEL_FILE)
-    for name in wb.sheetnames[:]:
-        if name.endswith("統計"):
+@perf.timed("generate_stats")
+def generate_stats(progress=None):
+    """
+    產生統計報表，另存於 report.REPORT_FILE，不再寫入開獎資料檔。
+    舊版留在資料檔中的「統計」分頁會一併移除，讓資料檔只保留開獎資料。
+    progress(done, total, message) 會在各階段開始前被呼叫。
+    """
+    import report
+    from openpyxl import load_workbook
+    if progress:
+        progress(0, 3, "讀取開獎資料")
+    with perf.span("excel.load"):
+        wb = load_workbook(EXCEL_FILE, read_only=True)
+    try:
+        draws = load_draws(wb)
+        legacy = [name for name in wb.sheetnames if name.endswith("統計")]
+    finally:
+        wb.close()
+    if legacy:
+        if progress:
+            progress(1, 3, "移除舊版統計分頁")
+        # 只有真的有舊版分頁時才以可寫模式重新開啟
+        with perf.span("excel.load"):
+            wb = load_workbook(EXCEL_FILE)
+        for name in legacy:
             del wb[name]
-    for name in wb.sheetnames:
-        if name.isdigit():
-            ws = wb[name]
-            counter = Counter()
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                counter.update(row[1:6])
-            stat_ws = wb.create_sheet(title=name + "統計")
-            stat_ws.append(["號碼", "出現次數"])
-            for num in sorted(counter):
-                stat_ws.append([num, counter[num]])
-                if is_multiple_of_3(num):
-                    stat_ws[f"A{stat_ws.max_row}"].font = Font(color="FF0000")
-    wb.save(EXCEL_FILE)
-
-def generate_multiples_of_3_chart():
-    wb = load_workbook(EXCEL_FILE)
-    counter = Counter()
-    for sheet in wb.sheetnames:
-        if sheet.isdigit():
-            for row in wb[sheet].iter_rows(min_row=2, values_only=True):
-                counter.update(row[1:6])
-    data = {n: counter[n] for n in range(3, 40, 3)}
-    nums, counts = list(data.keys()), list(data.values())
-    plt.figure(figsize=(10, 5))
-    bars = plt.bar([str(n) for n in nums], counts, color='red')
-    plt.title("今彩539 - 3 的倍數號碼出現次數")
-    plt.xlabel("號碼")
-    plt.ylabel("出現次數")
-    for bar in bars:
-        height = bar.get_height()
-        plt.text(bar.get_x() + bar.get_width()/2, height + 0.5, str(int(height)),
-                 ha='center', va='bottom', fontsize=9)
-    plt.tight_layout()
-    plt.savefig(CHART_FILE)
-    plt.show()
-
-def analyze_transition_patterns():
-    wb = load_workbook(EXCEL_FILE)
-    records = []
+        save_workbook(wb)
+        write_latest_draw(draws)
+    if progress:
+        progress(2, 3, "匯出報表")
+    return report.export_report(draws=draws)
+
+@perf.timed("load_draws")
+def load_draws(wb=None):
+    """讀取所有年度分頁，回傳依日期排序的 [(日期字串, [五個號碼]), ...]；可傳入已開啟的 wb"""
+    if wb is None:
+        from openpyxl import load_workbook
+        with perf.span("excel.load"):
+            wb = load_workbook(EXCEL_FILE)
+    draws = []
     for sheet_name in sorted(wb.sheetnames):
         if sheet_name.isdigit():
             for row in wb[sheet_name].iter_rows(min_row=2, values_only=True):
-                if all(isinstance(n, int) for n in row[1:6]):
-                    records.append((row[0], set(row[1:6])))
+                if row[0] and all(isinstance(n, int) for n in row[1:6]):
+                    draws.append((str(row[0]).split(" ")[0], list(row[1:6])))
+    draws.sort(key=lambda d: d[0])
+    perf.incr("rows_parsed", len(draws))
+    return draws
+
+def draw_matrix(draws):
+    """把 [(日期, 號碼們), ...] 轉成 (期數, 39) 的 0/1 uint8 出現矩陣，第 n-1 欄代表號碼 n"""
+    import numpy as np
+    X = np.zeros((len(draws), 39), dtype=np.uint8)
+    if draws:
+        idx = np.array([list(nums) for _, nums in draws], dtype=np.intp) - 1
+        X[np.arange(len(draws))[:, None], idx] = 1
+    return X
+
+def generate_multiples_of_3_chart(progress=None):
+    import shutil
+    import charts
+    if progress:
+        progress(0, 2, "讀取開獎資料")
+    draws = load_draws()
+    if progress:
+        progress(1, 2, "繪製圖表")
+    path = charts.render_residue_chart(draws, k=3, r=0)
+    shutil.copyfile(path, CHART_FILE)
+    return CHART_FILE
+
+@perf.timed("build_transitions")
+def build_transitions(draws):
+    """由 [(日期, 號碼們), ...] 建立轉移次數：transitions[當期號碼][下一期號碼] = 次數"""
     transitions = defaultdict(Counter)
-    for i in range(len(records) - 1):
-        for num in records[i][1]:
-            transitions[num].update(records[i + 1][1])
+    for i in range(len(draws) - 1):
+        for num in draws[i][1]:
+            transitions[num].update(draws[i + 1][1])
+    return transitions
+
+def write_transition_file(transitions):
     with open(TRANSITION_FILE, "w", encoding="utf-8") as f:
         for num in range(1, 40):
             if num in transitions:
@@ -164,7 +253,80 @@ def analyze_transition_patterns():
                     f.write(f"    - {follow_num:02d}：出現 {count} 次\n")
                 f.write("\n")
 
+def analyze_transition_patterns(progress=None):
+    """重建號碼轉移分析檔；progress(done, total, message) 會在各階段開始前被呼叫"""
+    if progress:
+        progress(0, 2, "讀取開獎資料")
+    draws = load_draws()
+    if progress:
+        progress(1, 2, "計算轉移次數")
+    write_transition_file(build_transitions(draws))
+    write_latest_draw(draws)
+
+def write_latest_draw(draws):
+    """把最新一期寫成小型 JSON，供 recommend 不必開啟 Excel 即可取得"""
+    if not draws:
+        return
+    date, nums = draws[-1]
+    with open(LATEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"date": date, "nums": list(nums)}, f)
+
+def latest_draw():
+    """
+    回傳 (最新日期, [五個號碼])。
+    LATEST_FILE 比 Excel 新時直接讀取，否則重新讀 Excel 並更新 LATEST_FILE。
+    """
+    if os.path.exists(LATEST_FILE) and (not os.path.exists(EXCEL_FILE)
+                                        or os.path.getmtime(LATEST_FILE) >= os.path.getmtime(EXCEL_FILE)):
+        perf.incr("latest_draw.cache_hit")
+        with open(LATEST_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data["date"], data["nums"]
+    perf.incr("latest_draw.cache_miss")
+    draws = load_draws()
+    write_latest_draw(draws)
+    return draws[-1] if draws else (None, [])
 
+def parse_date(s):
+    """把 YYYY-MM-DD / YYYY/M/D（可含時間）字串轉成 YYYY-MM-DD；失敗回 None"""
+    m = re.match(r"^\s*(\d{4})[/-](\d{1,2})[/-](\d{1,2})", str(s or ""))
+    if not m:
+        return None
+    y, mth, d = map(int, m.groups())
+    return f"{y:04d}-{mth:02d}-{d:02d}"
+
+@perf.timed("check_hits")
+def check_hits(draws, history_csv):
+    """
+    逐筆推薦對照『下一期』是否中獎（以 top5 為準）
+    回傳 [(推薦時間, 基準日期, 對獎日期, 中獎數, 中獎號), ...]；
+    尚無下一期或日期錯誤時，對獎日期欄放說明文字，後兩欄為 "-"。
+    """
+    if not os.path.exists(history_csv):
+        return []
+    dates = [d for d, _ in draws]
+    rows = []
+    with open(history_csv, "r", encoding="utf-8") as f:
+        for r in csv.reader(f):
+            if len(r) < 3:
+                continue
+            ts_str, base_str, top5_str = r[0], r[1], r[2]
+            base = parse_date(base_str)
+            if not base:
+                rows.append((ts_str, base_str, "日期格式錯誤", "-", "-"))
+                continue
+            rec_top5 = set(int(x) for x in top5_str.split(",") if x.strip().isdigit())
+            idx = bisect_right(dates, base)
+            if idx >= len(dates):
+                rows.append((ts_str, base, "尚無下一期", "-", "-"))
+                continue
+            target_date, target_nums = draws[idx]
+            hits = sorted(rec_top5.intersection(target_nums))
+            rows.append((ts_str, base, target_date, len(hits), hits))
+    return rows
+
+
+@perf.timed("recommend_by_transition")
 def recommend_by_transition():
     if not os.path.exists(TRANSITION_FILE):
         return None
@@ -185,12 +347,8 @@ def recommend_by_transition():
                 count = int(parts[1].replace("出現", "").replace("次", "").strip())
                 transitions[current_key].append((num, count))
 
-    wb = load_workbook(EXCEL_FILE)
-    sheets = sorted([s for s in wb.sheetnames if s.isdigit()])
-    latest_sheet = wb[sheets[-1]]
-    rows = list(latest_sheet.iter_rows(min_row=2, values_only=True))
-    last_row = rows[-1]
-    last_nums = last_row[1:6]
+    _, last_nums = latest_draw()
+    last_nums = tuple(last_nums)
     counter = Counter()
     for n in last_nums:
         for to_num, score in transitions.get(n, []):
@@ -203,3 +361,209 @@ def recommend_by_transition():
     return last_nums, sorted(top10), top5
 
 
+@perf.timed("recommend_by_score")
+def recommend_by_score(weights=None, quota=None, draws=None, exclude_last=True, n=10):
+    """
+    綜合評分推薦（scoring.py），CLI、Tk 與 Streamlit 共用的推薦入口。
+    weights / quota 未指定時讀 config.json 的 score_weights / score_quota。
+    未傳入 draws 時優先使用預先算好的訊號檔，Excel 沒有變動時不必開啟 Excel。
+    回傳 ScoringEngine.score() 的結果，另加 top10（排序後）與 multiples_of_3（3 的倍數前三）；
+    開獎資料不足時回傳 None。
+    """
+    import scoring
+    engine = scoring.ScoringEngine(weights, exclude_last=exclude_last, quota=quota)
+    try:
+        result = engine.score(draws, n)
+    except ValueError:
+        return None
+    result["top10"] = sorted(result["picks"])
+    result["multiples_of_3"] = engine.multiples_of_3(result)
+    return result
+
+
+# =========================
+# 命令列介面（輸出 JSON，供 cron / pipeline 使用）
+# =========================
+
+def _cli_sync(args):
+    months = [int(m) for m in args.months.split(",")] if args.months else None
+    update_history(args.start_year, args.end_year, months)
+    updated_today = update_today()
+    date, nums = latest_draw()
+    return {"updated_today": updated_today, "latest_date": date, "latest_nums": nums}
+
+def _cli_stats(args):
+    if not args.no_sheets:
+        generate_stats()
+    counter = Counter()
+    for _, nums in load_draws():
+        counter.update(nums)
+    return {"frequency": {str(n): counter[n] for n in range(1, 40)}}
+
+def _cli_report(args):
+    import report
+    return {"report": report.export_report(args.out, args.format)}
+
+def _cli_import(args):
+    import ingest
+    return ingest.import_archives(args.files, args.rejects, args.dry_run, args.workers)
+
+def _cli_transitions(args):
+    analyze_transition_patterns()
+    return {"transition_file": TRANSITION_FILE}
+
+def _engine_options(args):
+    """--weights / --quota 轉成 recommend_by_score() 的參數；格式錯誤時丟出 ValueError"""
+    import scoring
+    return {
+        "weights": scoring.parse_weights(args.weights) if args.weights else None,
+        "quota": scoring.parse_quota(args.quota) if args.quota else None,
+        "exclude_last": not args.keep_last,
+    }
+
+def _cli_recommend(args):
+    import scoring
+    try:
+        result = recommend_by_score(**_engine_options(args))
+    except ValueError as e:
+        return {"error": str(e)}
+    except KeyError as e:
+        return {"error": str(e.args[0]), "available": sorted(scoring.SCORERS)}
+    if not result:
+        return {"error": "開獎資料不足，請先執行 sync 或 import"}
+    out = {
+        "base_date": result["last_date"],
+        "last_nums": list(result["last_nums"]),
+        "top10": result["top10"],
+        "top5": result["top5"],
+        "top3_multiples_of_3": result["multiples_of_3"],
+        "timings": result["timings"],
+    }
+    if args.detail:
+        out.update({
+            "weights": result["weights"],
+            "combined": {str(n): round(float(result["combined"][n - 1]), 4) for n in range(1, 40)},
+            "cached": result["cached"],
+            "fingerprint": result["fingerprint"],
+        })
+    return out
+
+def _cli_recommend_batch(args):
+    import batch_recommend
+    try:
+        df = batch_recommend.recommend_batch(start=args.start, end=args.end,
+                                             point_in_time=not args.full_history)
+    except ValueError as e:
+        return {"error": str(e)}
+    df = df.astype(object).where(df.notna(), None)
+    return {"rows": df.to_dict(orient="records")}
+
+def _cli_randomness(args):
+    import randomness
+    return randomness.run_battery(load_draws(), args.permutations, args.seed, args.workers,
+                                  by_year=not args.overall_only)
+
+def _cli_check_hits(args):
+    rows = check_hits(load_draws(), args.csv)
+    keys = ("recommended_at", "base_date", "target_date", "hit_count", "hits")
+    return {"rows": [dict(zip(keys, r)) for r in rows]}
+
+def _time_command(cmd, repeat):
+    import subprocess
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=app_dir, check=True, stdout=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return round(samples[len(samples) // 2], 1)
+
+def _cli_bench(args):
+    """量測冷啟動時間（子行程中位數），超過 STARTUP_BUDGET_MS 時結束碼為 1"""
+    base = _time_command([sys.executable, "-c", "pass"], args.repeat)
+    import_ms = _time_command([sys.executable, "-c", "import main_module"], args.repeat)
+    recommend_ms = _time_command([sys.executable, os.path.abspath(__file__), "recommend"], args.repeat)
+    budget = args.budget_ms or STARTUP_BUDGET_MS
+    # 扣掉直譯器本身的啟動時間，只計算本模組的成本
+    over = (recommend_ms - base) > budget
+    return {
+        "interpreter_ms": base,
+        "import_ms": import_ms,
+        "recommend_ms": recommend_ms,
+        "budget_ms": budget,
+        "within_budget": not over,
+        "_exit": 1 if over else 0,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main_module", description="今彩539 資料處理（JSON 輸出）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("sync", help="抓取歷史與今日資料並寫入 Excel")
+    p.add_argument("--start-year", type=int)
+    p.add_argument("--end-year", type=int)
+    p.add_argument("--months", help="以逗號分隔，例如 1,2,3")
+    p.set_defaults(func=_cli_sync)
+
+    p = sub.add_parser("import", help="匯入歷史開獎檔（CSV / xlsx / API JSON），不需網路")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--rejects", default=os.path.join(app_dir, "539_import_rejects.csv"), help="退件報告 CSV")
+    p.add_argument("--dry-run", action="store_true", help="只驗證與統計，不寫入 Excel")
+    p.add_argument("--workers", type=int, help="平行解析的行程數")
+    p.set_defaults(func=_cli_import)
+
+    p = sub.add_parser("stats", help="號碼出現次數統計")
+    p.add_argument("--no-sheets", action="store_true", help="只輸出 JSON，不產生統計報表")
+    p.set_defaults(func=_cli_stats)
+
+    p = sub.add_parser("report", help="匯出統計 / 分析報表（與資料檔分開）")
+    p.add_argument("--format", choices=("xlsx", "csv"), default="xlsx")
+    p.add_argument("--out", help="xlsx 檔名，或 csv 輸出資料夾")
+    p.set_defaults(func=_cli_report)
+
+    p = sub.add_parser("transitions", help="建立號碼轉移分析檔")
+    p.set_defaults(func=_cli_transitions)
+
+    p = sub.add_parser("recommend", help="綜合評分推薦號碼（轉移、頻率、遺漏等訊號加權）")
+    p.add_argument("--weights", help="例如 transition=1,gap=0.5,neighbors=0.5；預設讀 config.json 的 score_weights")
+    p.add_argument("--quota", help="餘數配額 k:r:最少:最多，例如 3:0:1:3（除以 3 餘 0 的號碼 1~3 個）")
+    p.add_argument("--keep-last", action="store_true", help="不排除上一期號碼")
+    p.add_argument("--detail", action="store_true", help="一併輸出 39 碼綜合分數、權重與快取狀態")
+    p.set_defaults(func=_cli_recommend)
+
+    p = sub.add_parser("recommend-batch", help="期間內每一期的推薦（回測）")
+    p.add_argument("--start", help="起始日期 YYYY-MM-DD")
+    p.add_argument("--end", help="結束日期 YYYY-MM-DD")
+    p.add_argument("--full-history", action="store_true", help="使用全部歷史（含基準日之後）的轉移")
+    p.set_defaults(func=_cli_recommend_batch)
+
+    p = sub.add_parser("randomness", help="隨機性檢定（均勻度、號碼對、連串、轉移排列檢定）")
+    p.add_argument("--permutations", type=int, default=1000)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--workers", type=int, help="排列檢定的行程數，預設為 CPU 數")
+    p.add_argument("--overall-only", action="store_true", help="不分年度，只算全部期數")
+    p.set_defaults(func=_cli_randomness)
+
+    p = sub.add_parser("check-hits", help="檢查推薦歷史是否中獎（對照下一期）")
+    p.add_argument("--csv", default=os.path.join(app_dir, "recommend_history.csv"))
+    p.set_defaults(func=_cli_check_hits)
+
+    p = sub.add_parser("bench", help="量測啟動時間是否在預算內")
+    p.add_argument("--repeat", type=int, default=5)
+    p.add_argument("--budget-ms", type=float)
+    p.set_defaults(func=_cli_bench)
+
+    args = parser.parse_args(argv)
+    with perf.profile(args.command):
+        result = args.func(args)
+    code = result.pop("_exit", 0)
+    if perf.ENABLED:
+        result["perf"] = perf.snapshot()
+    if "error" in result:
+        code = 1
+    print(json.dumps(result, ensure_ascii=False, indent=2, default=str))
+    return code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# perf.py
+#
+# 輕量效能量測：
+#   - span(name)：計時區段（次數 / 總時間 / 最長時間）
+#   - incr(name, n)：計數器（HTTP 次數、位元組、解析列數、快取命中…）
+#   - profile(name)：選用的 cProfile，輸出 .prof 檔
+#   - snapshot() / export_json()：匯出成 JSON；設定 LOTTO539_PERF_LOG 時每個區段另寫一行 JSON log
+#
+# 預設關閉：span() 只回傳共用的空 context、incr() 直接返回，幾乎沒有額外成本。
+# 開啟方式：環境變數 LOTTO539_PERF=1，或程式中呼叫 perf.enable()。
+# cProfile 另需 LOTTO539_PROFILE=<輸出資料夾>。
+
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+ENABLED = os.environ.get("LOTTO539_PERF", "").lower() in ("1", "true", "yes")
+LOG_FILE = os.environ.get("LOTTO539_PERF_LOG")
+PROFILE_DIR = os.environ.get("LOTTO539_PROFILE")
+
+_lock = threading.Lock()
+_spans = {}      # name -> {"count", "total", "max"}
+_counters = {}   # name -> int
+_NULL = nullcontext()
+
+
+def enable(on=True):
+    global ENABLED
+    ENABLED = on
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def incr(name, n=1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+@contextmanager
+def _span(name):
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _lock:
+            s = _spans.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            s["count"] += 1
+            s["total"] += elapsed
+            s["max"] = max(s["max"], elapsed)
+        if LOG_FILE:
+            _log({"span": name, "seconds": round(elapsed, 6), "ts": time.time()})
+
+
+def span(name):
+    """with perf.span("excel.save"): ... ；關閉時回傳空 context"""
+    return _span(name) if ENABLED else _NULL
+
+
+def timed(name):
+    """函式裝飾器版本的 span"""
+    def deco(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+@contextmanager
+def profile(name):
+    """PROFILE_DIR 有設定且量測開啟時，以 cProfile 記錄區段並寫出 <name>.prof"""
+    if not (ENABLED and PROFILE_DIR):
+        yield
+        return
+    import cProfile
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        prof.dump_stats(os.path.join(PROFILE_DIR, f"{name}.prof"))
+
+
+def snapshot():
+    with _lock:
+        spans = {k: {"count": v["count"], "total": round(v["total"], 6),
+                     "mean": round(v["total"] / v["count"], 6), "max": round(v["max"], 6)}
+                 for k, v in _spans.items()}
+        return {"enabled": ENABLED, "spans": spans, "counters": dict(_counters)}
+
+
+def export_json(path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+
+
+def _log(event):
+    with _lock, open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(event, ensure_ascii=False) + "\n")
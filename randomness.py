@@ -0,0 +1,191 @@
+# randomness.py
+#
+# 隨機性檢定組合，用來判斷各種推薦方法是否真的優於亂猜：
+#   - uniformity：各號碼出現次數的卡方均勻度檢定（整體 df=38，另附每個號碼各自的 p 值）
+#   - pairs：741 組號碼對同時開出次數的卡方檢定
+#   - runs_parity / runs_high_low：每期「奇數多 / 大號多」序列的 Wald–Wolfowitz 連串檢定
+#   - transition_permutation：轉移次數表離散程度的排列檢定（打亂期數順序）
+# 排列檢定以「一批多個排列」合併成一次矩陣乘法計算，大量排列時再分給多個行程。
+
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import perf
+from main_module import draw_matrix
+
+HIGH_FROM = 21           # 與 excel.load_history_data 相同：> 20 為大號
+CHUNK_ELEMENTS = 20_000_000
+POOL_THRESHOLD = 2_000   # 排列數達此數量才開行程池
+
+
+# ---------- 分布函數 ----------
+
+def chi2_sf(x, df):
+    """卡方分布右尾機率；有 scipy 時用 scipy，否則 df=1,2 用精確式、其餘用 Wilson–Hilferty 近似"""
+    try:
+        from scipy.stats import chi2
+        return float(chi2.sf(x, df))
+    except ImportError:
+        pass
+    if x <= 0:
+        return 1.0
+    if df == 1:
+        return math.erfc(math.sqrt(x / 2))
+    if df == 2:
+        return math.exp(-x / 2)
+    z = ((x / df) ** (1 / 3) - (1 - 2 / (9 * df))) / math.sqrt(2 / (9 * df))
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def normal_two_sided(z):
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+# ---------- 個別檢定 ----------
+
+def uniformity(X):
+    n = len(X)
+    counts = X.sum(axis=0, dtype=np.int64)
+    p = 5 / 39
+    expected = n * p
+    # 每期是 5 個「不重複」號碼：單一號碼次數的變異數為 n·p(1−p)，號碼之間為負相關
+    # （共變異數 −n·p(1−p)/38），以 n·p(1−p)·39/38 標準化後才是 df=38 的卡方
+    chi2 = float(((counts - expected) ** 2).sum() / (n * p * (1 - p) * 39 / 38)) if n else 0.0
+    # 單一號碼：出現次數 ~ Binomial(n, 5/39)，以 1 自由度卡方近似
+    per = (counts - expected) ** 2 / (n * p * (1 - p)) if n else np.zeros(39)
+    return {
+        "chi2": round(chi2, 3), "df": 38, "p": chi2_sf(chi2, 38),
+        "per_number": {str(k + 1): {"count": int(counts[k]), "p": chi2_sf(float(per[k]), 1)} for k in range(39)},
+    }
+
+
+def pairs(X):
+    n = len(X)
+    X = X.astype(np.int64)
+    co = X.T @ X
+    iu = np.triu_indices(39, 1)
+    observed = co[iu]
+    expected = n * (5 * 4) / (39 * 38)
+    chi2 = float(((observed - expected) ** 2).sum() / expected) if n else 0.0
+    return {"chi2": round(chi2, 3), "df": len(observed) - 1, "p": chi2_sf(chi2, len(observed) - 1)}
+
+
+def runs_test(seq):
+    """Wald–Wolfowitz 連串檢定；seq 為 0/1 陣列"""
+    seq = np.asarray(seq, dtype=bool)
+    n1 = int(seq.sum())
+    n2 = len(seq) - n1
+    if n1 == 0 or n2 == 0:
+        return {"runs": 1 if len(seq) else 0, "z": None, "p": None}
+    runs = int(1 + np.count_nonzero(seq[1:] != seq[:-1]))
+    n = n1 + n2
+    mean = 2 * n1 * n2 / n + 1
+    var = 2 * n1 * n2 * (2 * n1 * n2 - n) / (n * n * (n - 1))
+    z = (runs - mean) / math.sqrt(var) if var > 0 else 0.0
+    return {"runs": runs, "expected": round(mean, 2), "z": round(z, 3), "p": normal_two_sided(z)}
+
+
+def _dispersion(T):
+    """轉移表 (..., 39, 39) 相對於獨立期望值的卡方統計量"""
+    T = T.astype(np.float64)
+    rows = T.sum(axis=-1, keepdims=True)
+    cols = T.sum(axis=-2, keepdims=True)
+    total = rows.sum(axis=-2, keepdims=True)
+    E = rows * cols / np.maximum(total, 1)
+    return np.where(E > 0, (T - E) ** 2 / np.where(E > 0, E, 1), 0).sum(axis=(-1, -2))
+
+
+def _incidence(nums):
+    """(N+1, 39) float32 出現矩陣，最後多一列 0 給「沒有下一期」使用"""
+    N = len(nums)
+    X = np.zeros((N + 1, 39), dtype=np.float32)
+    X[np.arange(N)[:, None], nums] = 1
+    return X
+
+
+def _transition_tables(X, orders):
+    """
+    X 為 _incidence() 的結果；orders (B, N) 為期數排列。
+    排列後的轉移表 T = X^T @ X[succ]，succ[j] 為 j 在排列中的下一期；
+    B 個排列的 X[succ] 併成 (N, B*39) 後只需一次大型矩陣乘法。
+    """
+    B, N = orders.shape
+    succ = np.empty((B, N), dtype=np.intp)
+    np.put_along_axis(succ, orders[:, :-1], orders[:, 1:], axis=1)
+    succ[np.arange(B), orders[:, -1]] = N
+    Y = X[succ.T].reshape(N, B * 39)
+    return (X[:N].T @ Y).reshape(39, B, 39).transpose(1, 0, 2)
+
+
+def _perm_chunk(nums, n_perm, seed):
+    """行程池工作：回傳 n_perm 個隨機排列的離散統計量"""
+    rng = np.random.default_rng(seed)
+    N = len(nums)
+    X = _incidence(nums)
+    batch = max(1, CHUNK_ELEMENTS // max(1, N * 39))
+    out = []
+    for lo in range(0, n_perm, batch):
+        b = min(batch, n_perm - lo)
+        orders = rng.permuted(np.tile(np.arange(N), (b, 1)), axis=1)
+        out.append(_dispersion(_transition_tables(X, orders)))
+    return np.concatenate(out) if out else np.empty(0)
+
+
+def transition_permutation(nums, permutations=1000, seed=0, workers=None):
+    """
+    虛無假設：期與期之間獨立（順序可交換）。
+    統計量：轉移表的卡方離散程度；p = (1 + #{排列統計量 >= 觀察值}) / (1 + 排列數)
+    """
+    nums = np.asarray(nums, dtype=np.int64) - 1
+    N = len(nums)
+    if N < 3 or permutations <= 0:
+        return {"statistic": None, "p": None, "permutations": 0}
+    observed = float(_dispersion(_transition_tables(_incidence(nums), np.arange(N)[None, :]))[0])
+    workers = workers or 1
+    n_tasks = workers * 2 if permutations >= POOL_THRESHOLD and workers > 1 else 1
+    seeds = np.random.SeedSequence(seed).spawn(max(1, n_tasks))
+    sizes = [len(a) for a in np.array_split(np.arange(permutations), len(seeds))]
+    if len(seeds) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_perm_chunk, [nums] * len(seeds), sizes, seeds))
+    else:
+        parts = [_perm_chunk(nums, permutations, seeds[0])]
+    null = np.concatenate(parts)
+    p = (1 + int(np.count_nonzero(null >= observed))) / (1 + len(null))
+    return {"statistic": round(observed, 3), "null_mean": round(float(null.mean()), 3),
+            "p": p, "permutations": len(null)}
+
+
+# ---------- 整合 ----------
+
+def _battery(nums, X, permutations, seed, workers):
+    return {
+        "draws": len(nums),
+        "uniformity": uniformity(X),
+        "pairs": pairs(X),
+        "runs_parity": runs_test((nums % 2 == 1).sum(axis=1) >= 3),
+        "runs_high_low": runs_test((nums >= HIGH_FROM).sum(axis=1) >= 3),
+        "transition_permutation": transition_permutation(nums, permutations, seed, workers),
+    }
+
+
+@perf.timed("randomness.run_battery")
+def run_battery(draws, permutations=1000, seed=0, workers=None, by_year=True):
+    """
+    draws：[(日期, 號碼們), ...]。回傳 {"overall": {...}, "by_year": {"2025": {...}, ...}}
+    workers：行程數（None = CPU 數）；排列數達 POOL_THRESHOLD 才會開行程池。
+    """
+    workers = workers or os.cpu_count() or 1
+    nums = np.array([sorted(n) for _, n in draws], dtype=np.int64).reshape(-1, 5)
+    X = draw_matrix(draws)
+    report = {"overall": _battery(nums, X, permutations, seed, workers)}
+    if by_year:
+        years = np.array([str(d)[:4] for d, _ in draws])
+        report["by_year"] = {}
+        for y in sorted(set(years.tolist())):
+            m = years == y
+            report["by_year"][y] = _battery(nums[m], X[m], permutations, seed, workers)
+    return report
@@ -0,0 +1,101 @@
+# report.py
+#
+# 統計 / 分析報表匯出，與開獎資料檔 539_by_year.xlsx 分開存放：
+#   - xlsx：openpyxl write_only 串流寫出，記憶體用量不隨年份數增加
+#   - csv：每張表一個 CSV 檔，放在同一個資料夾
+# 報表內容：各年度號碼出現次數（3 的倍數以紅字標示）、轉移次數、號碼遺漏、號碼對同時開出次數。
+
+import os
+import csv
+from itertools import groupby
+
+import numpy as np
+
+import main_module as core
+import perf
+
+REPORT_FILE = os.path.join(core.app_dir, core.config.get("report_file", "539_report.xlsx"))
+RED = "FF0000"
+
+
+def _tables(draws):
+    """
+    依序產生 (表名, 表頭, 列產生器, 需紅字的欄位索引或 None)。
+    只走一次年度分組：每年建立該年的小型出現矩陣，順便累加轉移、同時開出與遺漏，
+    記憶體用量只與單一年度的期數有關，不隨年份數增加。
+    """
+    import gaps
+    T = np.zeros((39, 39), dtype=np.int64)
+    co = np.zeros((39, 39), dtype=np.int64)
+    tracker = gaps.GapTracker()
+    prev = None   # 上一年最後一期的出現列，用來接上跨年的轉移
+    for year, group in groupby(draws, key=lambda d: str(d[0])[:4]):
+        X = core.draw_matrix(list(group))
+        Xi = X.astype(np.int32)
+        co += Xi.T @ Xi
+        chain = Xi if prev is None else np.vstack([prev, Xi])
+        T += chain[:-1].T @ chain[1:]
+        prev = Xi[-1:]
+        tracker.extend(X)
+        counts = Xi.sum(axis=0)
+        rows = ([n, int(counts[n - 1])] for n in range(1, 40) if counts[n - 1])
+        yield f"{year}統計", ["號碼", "出現次數"], rows, 0
+
+    yield ("轉移", ["當期號碼"] + [f"下一期{n:02d}" for n in range(1, 40)],
+           ([a + 1] + T[a].tolist() for a in range(39)), 0)
+
+    gap_rows = tracker.table()
+    yield "遺漏", list(gap_rows[0].keys()), (list(r.values()) for r in gap_rows), 0
+
+    yield ("同時開出", ["號碼A", "號碼B", "次數"],
+           ([a + 1, b + 1, int(co[a, b])] for a in range(39) for b in range(a + 1, 39)), None)
+
+
+def _write_xlsx(path, tables):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    red = Font(color=RED)
+    wb = Workbook(write_only=True)
+    for name, header, rows, mark_col in tables:
+        ws = wb.create_sheet(title=name)
+        ws.append(header)
+        for row in rows:
+            if mark_col is not None and core.is_multiple_of_3(row[mark_col]):
+                cell = WriteOnlyCell(ws, value=row[mark_col])
+                cell.font = red
+                row = row[:mark_col] + [cell] + row[mark_col + 1:]
+            ws.append(row)
+            perf.incr("report.rows")
+    with perf.span("report.save"):
+        wb.save(path)
+
+
+def _write_csv(directory, tables):
+    os.makedirs(directory, exist_ok=True)
+    for name, header, rows, _ in tables:
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="", encoding="utf-8-sig") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in rows:
+                writer.writerow(row)
+                perf.incr("report.rows")
+
+
+@perf.timed("export_report")
+def export_report(path=None, fmt="xlsx", draws=None):
+    """
+    匯出統計報表，回傳輸出路徑。
+      - fmt="xlsx"：path 為活頁簿檔名（預設 REPORT_FILE）
+      - fmt="csv"：path 為資料夾（預設與 REPORT_FILE 同名去掉副檔名）
+    """
+    draws = draws if draws is not None else core.load_draws()
+    if fmt == "xlsx":
+        path = path or REPORT_FILE
+        _write_xlsx(path, _tables(draws))
+    elif fmt == "csv":
+        path = path or os.path.splitext(REPORT_FILE)[0]
+        _write_csv(path, _tables(draws))
+    else:
+        raise ValueError(f"不支援的報表格式：{fmt}")
+    return path
@@ -0,0 +1,297 @@
+# scheduler.py
+#
+# 背景更新常駐程式：每天開獎時間前後輪詢當月開獎清單（fetch_data），
+# 補齊所有缺少的期數（包含錯過輪詢區間的前幾天）後寫入 Excel 一次，
+# 並以增量方式更新轉移次數、號碼頻率與對獎結果，
+# 最後把狀態與衍生結果寫到 STATUS_FILE，UI 只需讀取這份預先算好的結果。
+# Excel 被其他程式（sync / import / UI）改動時，依修改時間自動重新載入。
+#
+# 執行：python scheduler.py
+
+import os
+import json
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from collections import Counter
+
+import main_module as core
+
+STATUS_FILE = os.path.join(core.app_dir, "539_daemon_status.json")
+HISTORY_CSV = os.path.join(core.app_dir, "recommend_history.csv")
+DRAW_TIME = core.config.get("draw_time", "20:30")            # 每日開獎時間（HH:MM）
+POLL_WINDOW_MINUTES = core.config.get("poll_window_minutes", 180)
+POLL_INTERVAL = core.config.get("poll_interval", 60)          # 秒
+MAX_BACKOFF = core.config.get("max_backoff", 900)             # 秒
+
+log = logging.getLogger("539.scheduler")
+
+
+class DerivedState:
+    """開獎資料的衍生結果，新的一期只需 O(5×5) 的增量更新"""
+
+    def __init__(self, draws):
+        self.draws = list(draws)
+        self.dates = set(d for d, _ in self.draws)
+        self.transitions = core.build_transitions(self.draws)
+        self.frequency = Counter()        # 全部期數的號碼出現次數
+        self.frequency_by_year = {}       # {"2025": Counter, ...}
+        for date, nums in self.draws:
+            self._count(date, nums)
+        self.hits = None                  # 對獎結果；尚未計算時為 None
+
+    def _count(self, date, nums):
+        self.frequency.update(nums)
+        self.frequency_by_year.setdefault(date[:4], Counter()).update(nums)
+
+    def append(self, date, nums):
+        """加入比目前最後一期更新的一期；已存在的日期回傳 False"""
+        if date in self.dates:
+            return False
+        if self.draws and date < self.draws[-1][0]:
+            raise ValueError(f"{date} 早於最後一期 {self.draws[-1][0]}，需重新建立")
+        if self.draws:
+            for num in self.draws[-1][1]:
+                self.transitions[num].update(nums)
+        self.draws.append((date, list(nums)))
+        self.dates.add(date)
+        self._count(date, nums)
+        return True
+
+    def snapshot(self):
+        return {
+            "draw_count": len(self.draws),
+            "last_draw": self.draws[-1] if self.draws else None,
+            "frequency": {str(n): self.frequency[n] for n in range(1, 40)},
+            "frequency_by_year": {y: {str(n): c[n] for n in range(1, 40)}
+                                  for y, c in sorted(self.frequency_by_year.items())},
+            "hits": None if self.hits is None else [list(r) for r in self.hits],
+        }
+
+
+class DrawScheduler:
+    """
+    以 asyncio 排程的每日更新器。
+      - clock：回傳目前時間的函式（測試時可換成假時鐘）
+      - sleep：async 睡眠函式（測試時可換成立即返回的版本）
+      - fetch：fetch(year, month) 取得整個月份開獎清單的函式，預設為 core.fetch_data
+    """
+
+    def __init__(self, clock=datetime.now, sleep=asyncio.sleep, fetch=None,
+                 draw_time=DRAW_TIME, poll_window_minutes=POLL_WINDOW_MINUTES,
+                 poll_interval=POLL_INTERVAL, max_backoff=MAX_BACKOFF,
+                 status_file=STATUS_FILE, history_csv=HISTORY_CSV):
+        self.clock = clock
+        self.sleep = sleep
+        self.fetch = fetch or core.fetch_data
+        hh, mm = (int(x) for x in draw_time.split(":"))
+        self.draw_time = (hh, mm)
+        self.poll_window = timedelta(minutes=poll_window_minutes)
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.status_file = status_file
+        self.history_csv = history_csv
+        self.state = None
+        self._mtime = None
+        self._hits_mtime = None     # 計算對獎結果時推薦歷史檔的修改時間
+        self._status = {
+            "state": "idle",
+            "last_check": None,
+            "last_update": None,
+            "last_error": None,
+            "next_wake": None,
+            "attempts": 0,
+            "timings": {},
+        }
+
+    # ---------- 狀態 ----------
+
+    def status(self):
+        return dict(self._status, timings=dict(self._status["timings"]))
+
+    def _write_status(self):
+        data = {"status": self.status()}
+        if self.state is not None:
+            data["derived"] = dict(self.state.snapshot(), history_csv=os.path.abspath(self.history_csv),
+                                   history_csv_mtime=self._hits_mtime)
+        tmp = self.status_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.status_file)
+
+    def _timed(self, name, func, *args):
+        t0 = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._status["timings"][name] = round(time.perf_counter() - t0, 4)
+
+    # ---------- 排程 ----------
+
+    def next_window(self, now):
+        """回傳下一個輪詢區間的 (開始, 結束)；若目前正處於區間內則從現在開始"""
+        start = now.replace(hour=self.draw_time[0], minute=self.draw_time[1], second=0, microsecond=0)
+        end = start + self.poll_window
+        if now >= end:
+            start += timedelta(days=1)
+            end += timedelta(days=1)
+        return max(start, now), end
+
+    async def _sleep_until(self, when):
+        self._status["next_wake"] = when.isoformat(timespec="seconds")
+        delay = (when - self.clock()).total_seconds()
+        if delay > 0:
+            await self.sleep(delay)
+
+    @staticmethod
+    def _excel_mtime():
+        return os.path.getmtime(core.EXCEL_FILE) if os.path.exists(core.EXCEL_FILE) else None
+
+    def _csv_mtime(self):
+        return os.path.getmtime(self.history_csv) if os.path.exists(self.history_csv) else None
+
+    def load(self):
+        self._mtime = self._excel_mtime()
+        self.state = DerivedState(self._timed("load", core.load_draws) if self._mtime is not None else [])
+        self.refresh_hits()
+
+    def refresh_hits(self):
+        """以目前的開獎資料重新對獎，並記下推薦歷史檔的修改時間"""
+        self._hits_mtime = self._csv_mtime()
+        self.state.hits = self._timed("check_hits", core.check_hits, self.state.draws, self.history_csv)
+
+    def reload_if_changed(self):
+        """
+        Excel 的修改時間與上次載入時不同（其他程式寫入過）就重新建立衍生結果；
+        只有推薦歷史檔變動時只重新對獎。
+        """
+        if self.state is None or self._excel_mtime() != self._mtime:
+            self.load()
+            return True
+        if self._csv_mtime() != self._hits_mtime:
+            self.refresh_hits()
+        return False
+
+    def _months_to_fetch(self, now):
+        """從最後一期所在月份到本月（最多 12 個月），用來補齊錯過的期數"""
+        y, m = now.year, now.month
+        if self.state.draws:
+            last = self.state.draws[-1][0]
+            y0, m0 = int(last[:4]), int(last[5:7])
+        else:
+            y0, m0 = y, m
+        months = []
+        while (y, m) >= (y0, m0) and len(months) < 12:
+            months.append((y, m))
+            y, m = (y, m - 1) if m > 1 else (y - 1, 12)
+        return months[::-1]
+
+    def _fetch_missing(self, now):
+        """回傳尚未寫入的開獎紀錄（依日期排序，不含未來日期）"""
+        today = now.strftime("%Y-%m-%d")
+        missing = {}
+        for y, m in self._months_to_fetch(now):
+            for r in self.fetch(y, m) or []:
+                date = r["lotteryDate"].split("T")[0]
+                if date <= today and date not in self.state.dates:
+                    missing[date] = r
+        return [missing[d] for d in sorted(missing)]
+
+    async def run_once(self):
+        """檢查一次開獎；補齊缺少的期數，今日這一期已在資料中時回傳 True"""
+        self.reload_if_changed()
+        now = self.clock()
+        today = now.strftime("%Y-%m-%d")
+        self._status["last_check"] = now.isoformat(timespec="seconds")
+        self._status["attempts"] += 1
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        # 網路 I/O 丟到執行緒，避免卡住事件迴圈
+        records = await loop.run_in_executor(None, self._fetch_missing, now)
+        self._status["timings"]["fetch"] = round(time.perf_counter() - t0, 4)
+        if records:
+            await loop.run_in_executor(None, self._refresh, records)
+            self._status["last_update"] = records[-1]["lotteryDate"].split("T")[0]
+        return today in self.state.dates
+
+    def _refresh(self, records):
+        by_year = {}
+        for r in records:
+            by_year.setdefault(int(r["lotteryDate"][:4]), []).append(r)
+        self._timed("save", core.save_to_excel, by_year)
+        try:
+            for r in records:
+                self.state.append(r["lotteryDate"].split("T")[0], [int(n) for n in r["drawNumberSize"]])
+        except ValueError:
+            # 補到的期數落在既有資料中間，增量更新會算錯轉移，直接重新建立
+            self.load()
+        self._timed("transitions", core.write_transition_file, self.state.transitions)
+        if core.ENABLE_STATS:
+            self._timed("stats", core.generate_stats)
+        self.refresh_hits()
+        # 以上的寫入都是本程式自己做的，衍生結果已同步，不需要下次重新載入
+        self._mtime = self._excel_mtime()
+
+    async def poll_window_once(self):
+        """在今天的輪詢區間內以退避方式重試，直到拿到新的一期或區間結束"""
+        start, end = self.next_window(self.clock())
+        await self._sleep_until(start)
+        self._status["state"] = "polling"
+        self._status["attempts"] = 0
+        delay = self.poll_interval
+        while True:
+            try:
+                if await self.run_once():
+                    self._status["last_error"] = None
+                    return True
+            except Exception as e:
+                log.exception("更新失敗")
+                self._status["last_error"] = f"{type(e).__name__}: {e}"
+            finally:
+                self._write_status()
+            now = self.clock()
+            if now + timedelta(seconds=delay) >= end:
+                return False
+            await self._sleep_until(now + timedelta(seconds=delay))
+            delay = min(delay * 2, self.max_backoff)
+
+    async def run_forever(self):
+        self.load()
+        while True:
+            got = await self.poll_window_once()
+            self._status["state"] = "idle" if got else "missed"
+            self._write_status()
+            # 拿到資料或區間結束後，等到區間結束再排下一天
+            _, end = self.next_window(self.clock())
+            await self._sleep_until(end)
+
+
+def read_status(path=STATUS_FILE):
+    """給 UI 使用：讀取常駐程式最後寫出的狀態與衍生結果，沒有檔案時回傳 None"""
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def precomputed_hits(history_csv=HISTORY_CSV, path=STATUS_FILE):
+    """
+    常駐程式算好的對獎結果；只有在已經算過、對照的是同一個推薦歷史檔且該檔之後沒有變動、
+    而且狀態檔比 Excel 新時才回傳，否則回傳 None（呼叫端改用 core.check_hits）。
+    """
+    status = read_status(path)
+    derived = (status or {}).get("derived")
+    if not derived or derived.get("hits") is None or derived.get("history_csv") != os.path.abspath(history_csv):
+        return None
+    csv_mtime = os.path.getmtime(history_csv) if os.path.exists(history_csv) else None
+    if derived.get("history_csv_mtime") != csv_mtime:
+        return None
+    if os.path.exists(core.EXCEL_FILE) and os.path.getmtime(core.EXCEL_FILE) > os.path.getmtime(path):
+        return None
+    return [tuple(r) for r in derived["hits"]]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    asyncio.run(DrawScheduler().run_forever())
@@ -0,0 +1,322 @@
+# scoring.py
+#
+# 綜合評分引擎：每個訊號（轉移、頻率、衰減頻率、遺漏、相似開獎、高階轉移、ML 機率…）
+# 都是一個外掛函式 fn(ctx) → 長度 39 的分數向量，各自正規化到 0~1 後依權重加總，
+# 再套用限制條件（排除上一期號碼、餘數類別配額）選出推薦號碼。
+# 各訊號的結果以「開獎資料指紋」快取，同一份資料不會重算；每個訊號的耗時一併回傳。
+# 從 Excel 讀取時，內建訊號另存成 SIGNALS_FILE；Excel 沒有變動時直接讀這份結果，不必開啟 Excel。
+
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+import main_module as core
+import perf
+
+SCORERS = {}
+DEFAULT_WEIGHTS = {"transition": 1.0, "frequency": 0.3, "decay": 0.5, "gap": 0.3}
+CACHE_SIZE = 64
+DECAY_HALF_LIFE = 30     # 期
+MULTIPLES_OF_3 = {"k": 3, "r": 0, "min": 3, "max": 3}   # 「3 的倍數前三」用的配額
+
+SIGNALS_FILE = os.path.join(core.app_dir, "539_signals.json")
+
+_cache = OrderedDict()   # (指紋, 訊號名稱) -> 分數向量
+
+
+def register(name):
+    """註冊訊號外掛：@register("name") def fn(ctx): return np.ndarray(39)"""
+    def deco(fn):
+        SCORERS[name] = fn
+        return fn
+    return deco
+
+
+class Context:
+    """評分時共用的資料：開獎清單、出現矩陣（延遲建立）與資料指紋"""
+
+    def __init__(self, draws):
+        self.draws = draws
+        self._X = None
+        self._fingerprint = None
+
+    @property
+    def X(self):
+        if self._X is None:
+            self._X = core.draw_matrix(self.draws)
+        return self._X
+
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            h = hashlib.sha1(np.ascontiguousarray(self.X).tobytes())
+            h.update("|".join(str(d) for d, _ in self.draws[-1:]).encode("utf-8"))
+            self._fingerprint = h.hexdigest()[:16]
+        return self._fingerprint
+
+    @property
+    def last_nums(self):
+        return sorted(self.draws[-1][1]) if self.draws else []
+
+
+# ---------- 內建訊號 ----------
+
+@register("transition")
+def transition_scores(ctx):
+    """最近一期各號碼 → 下一期號碼的轉移次數加總（完整次數，非前 10 名）"""
+    import batch_recommend
+    return batch_recommend.score_matrix(ctx.X, np.array([len(ctx.X) - 1]), point_in_time=False)[0]
+
+
+@register("frequency")
+def frequency_scores(ctx):
+    return ctx.X.sum(axis=0, dtype=np.float64)
+
+
+@register("decay")
+def decay_scores(ctx):
+    """以半衰期 DECAY_HALF_LIFE 期加權的出現次數，越近期權重越大"""
+    age = np.arange(len(ctx.X) - 1, -1, -1, dtype=np.float64)
+    return (0.5 ** (age / DECAY_HALF_LIFE)) @ ctx.X
+
+
+@register("gap")
+def gap_scores(ctx):
+    import gaps
+    return gaps.GapTracker.from_matrix(ctx.X).scores()
+
+
+@register("neighbors")
+def neighbor_scores(ctx):
+    import similar
+    return similar.DrawIndex(ctx.draws).next_scores(ctx.last_nums, 50, exclude=len(ctx.draws) - 1)
+
+
+@register("higher_order")
+def higher_order_scores(ctx):
+    import higher_order
+    return higher_order.HigherOrderTransitions(2).fit(ctx.draws).score().astype(np.float64)
+
+
+@register("higher_order_across")
+def higher_order_across_scores(ctx):
+    """以「上上期 a、上一期 b」號碼對為條件的轉移"""
+    import higher_order
+    return higher_order.HigherOrderTransitions(2, "across").fit(ctx.draws).score().astype(np.float64)
+
+
+def probability_scorer(predict):
+    """
+    把 ML 模型包成訊號：predict(draws) 回傳 {號碼: 機率}。
+    模型會變動，因此不放進指紋快取（cacheable=False）。
+    """
+    def fn(ctx):
+        v = np.zeros(39)
+        for n, p in predict(ctx.draws).items():
+            if 1 <= int(n) <= 39:
+                v[int(n) - 1] = p
+        return v
+    return fn
+
+
+# ---------- 引擎 ----------
+
+def _load_signals():
+    """SIGNALS_FILE 的內容；記錄的 Excel 修改時間與目前不同（或檔案不存在）時回傳 None"""
+    if not os.path.exists(SIGNALS_FILE) or not os.path.exists(core.EXCEL_FILE):
+        return None
+    try:
+        with open(SIGNALS_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data if data.get("excel_mtime") == os.path.getmtime(core.EXCEL_FILE) else None
+
+
+def _save_signals(excel_mtime, ctx, vectors, previous=None):
+    data = {
+        "excel_mtime": excel_mtime,
+        "fingerprint": ctx.fingerprint,
+        "draw_count": len(ctx.draws),
+        "last_date": ctx.draws[-1][0],
+        "last_nums": ctx.last_nums,
+        "signals": {},
+    }
+    if previous and previous.get("fingerprint") == ctx.fingerprint:
+        data["signals"].update(previous["signals"])
+    data["signals"].update({name: [float(x) for x in v] for name, v in vectors.items()})
+    tmp = SIGNALS_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, SIGNALS_FILE)
+
+
+def _normalize(v):
+    v = np.asarray(v, dtype=np.float64)
+    lo, hi = v.min(), v.max()
+    return (v - lo) / (hi - lo) if hi > lo else np.zeros(39)
+
+
+def _apply_quota(order, scores, n, quota):
+    """
+    quota = {"k": 3, "r": 0, "min": 1, "max": 3}：推薦的 n 碼中「除以 k 餘 r」的號碼數量限制。
+    先依分數挑選並遵守上限，不足下限時以該類別最高分者替換掉非該類別中最低分者。
+    """
+    k, r = quota.get("k", 3), quota.get("r", 0)
+    lo, hi = quota.get("min", 0), quota.get("max", n)
+    in_class = lambda num: num % k == r
+    picks = []
+    for num in order:
+        if len(picks) == n:
+            break
+        if in_class(num) and sum(map(in_class, picks)) >= hi:
+            continue
+        picks.append(num)
+    extra = [num for num in order if in_class(num) and num not in picks]
+    while sum(map(in_class, picks)) < lo and extra:
+        others = [p for p in picks if not in_class(p)]
+        if not others:
+            break
+        picks.remove(min(others, key=lambda p: scores[p - 1]))
+        picks.append(extra.pop(0))
+    return sorted(picks, key=lambda p: -scores[p - 1])
+
+
+class ScoringEngine:
+    def __init__(self, weights=None, exclude_last=True, quota=None):
+        self.weights = dict(weights if weights is not None else core.config.get("score_weights", DEFAULT_WEIGHTS))
+        self.exclude_last = exclude_last
+        self.quota = quota if quota is not None else core.config.get("score_quota")
+        self._extra = {}   # name -> (fn, cacheable)
+
+    def add_scorer(self, name, fn, weight=1.0, cacheable=False):
+        self._extra[name] = (fn, cacheable)
+        self.weights[name] = weight
+
+    def _signal(self, ctx, name):
+        fn, cacheable = self._extra.get(name, (SCORERS.get(name), True))
+        if fn is None:
+            raise KeyError(f"未註冊的訊號：{name}")
+        key = (ctx.fingerprint, name)
+        if cacheable and key in _cache:
+            _cache.move_to_end(key)
+            perf.incr("scoring.cache_hit")
+            return _cache[key], True
+        perf.incr("scoring.cache_miss")
+        with perf.span(f"scoring.{name}"):
+            v = np.asarray(fn(ctx), dtype=np.float64)
+        if v.shape != (39,):
+            raise ValueError(f"訊號 {name} 回傳的長度不是 39：{v.shape}")
+        if cacheable:
+            _cache[key] = v
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        return v, False
+
+    def score(self, draws=None, n=10):
+        """
+        回傳 dict：
+          combined（39 碼綜合分數）、signals（各訊號原始分數）、picks（依分數排序的 n 碼）、
+          top5、timings（各訊號秒數）、cached（各訊號是否命中快取）、fingerprint、last_date
+        未傳入 draws 時從 Excel 讀取，並優先使用 SIGNALS_FILE 中預先算好的內建訊號。
+        開獎資料少於 2 期時丟出 ValueError。
+        """
+        names = [name for name, w in self.weights.items() if w]
+        stored = excel_mtime = None
+        if draws is None:
+            stored = _load_signals()
+            if stored and all(name in stored["signals"] and name not in self._extra for name in names):
+                perf.incr("scoring.signals_file_hit")
+                signals = {name: np.array(stored["signals"][name]) for name in names}
+                return self._combine(signals, {name: 0.0 for name in names}, {name: True for name in names},
+                                     stored["fingerprint"], stored["last_date"], stored["last_nums"], n)
+            if not os.path.exists(core.EXCEL_FILE):
+                raise ValueError("開獎資料不足")
+            excel_mtime = os.path.getmtime(core.EXCEL_FILE)
+            draws = core.load_draws()
+        if len(draws) < 2:
+            raise ValueError("開獎資料不足")
+
+        ctx = Context(draws)
+        signals, timings, cached = {}, {}, {}
+        for name in names:
+            t0 = time.perf_counter()
+            v, hit = self._signal(ctx, name)
+            timings[name] = round(time.perf_counter() - t0, 6)
+            signals[name], cached[name] = v, hit
+        builtin = {name: v for name, v in signals.items() if name not in self._extra}
+        if excel_mtime is not None and builtin:
+            _save_signals(excel_mtime, ctx, builtin, stored)
+        return self._combine(signals, timings, cached, ctx.fingerprint, draws[-1][0], ctx.last_nums, n)
+
+    def _combine(self, signals, timings, cached, fingerprint, last_date, last_nums, n):
+        combined = np.zeros(39)
+        for name, v in signals.items():
+            combined += self.weights[name] * _normalize(v)
+        result = {
+            "fingerprint": fingerprint,
+            "last_date": last_date,
+            "last_nums": last_nums,
+            "combined": combined,
+            "signals": signals,
+            "weights": dict(self.weights),
+            "timings": timings,
+            "cached": cached,
+        }
+        result["picks"] = self.select(result, n)
+        result["top5"] = result["picks"][:5]
+        return result
+
+    def select(self, result, n, quota=None):
+        """
+        依 score() 結果的綜合分數挑出 n 碼（分數高到低），不重新計算訊號。
+        quota 預設為引擎的 self.quota；例如 select(result, 3, MULTIPLES_OF_3) 取 3 的倍數前三。
+        """
+        quota = quota if quota is not None else self.quota
+        scores = np.array(result["combined"], dtype=np.float64)
+        if self.exclude_last and result["last_nums"]:
+            scores[np.array(result["last_nums"], dtype=np.intp) - 1] = -np.inf
+        order = [int(i) + 1 for i in np.argsort(-scores, kind="stable") if np.isfinite(scores[i])]
+        return _apply_quota(order, scores, n, quota) if quota else order[:n]
+
+    def multiples_of_3(self, result, n=3):
+        return self.select(result, n, dict(MULTIPLES_OF_3, min=n, max=n))
+
+    def recommend(self, draws=None):
+        """與 recommend_by_transition() 相同格式：(最近一期號碼, 推薦 10 碼排序, 前 5 碼)"""
+        result = self.score(draws)
+        return tuple(result["last_nums"]), sorted(result["picks"]), result["top5"]
+
+
+def parse_weights(text):
+    """ "transition=1,gap=0.5" → {"transition": 1.0, "gap": 0.5}；格式錯誤時丟出 ValueError """
+    weights = {}
+    for item in text.split(","):
+        name, _, w = item.partition("=")
+        if not name.strip():
+            continue
+        try:
+            weights[name.strip()] = float(w) if w.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"權重格式錯誤：{item}（應為 名稱=數字）")
+    return weights
+
+
+def parse_quota(text):
+    """ "3:0:1:3" → {"k": 3, "r": 0, "min": 1, "max": 3}；格式錯誤時丟出 ValueError """
+    parts = text.split(":")
+    try:
+        k, r, lo, hi = (int(v) for v in parts)
+    except ValueError:
+        raise ValueError(f"配額格式錯誤：{text}（應為 k:r:最少:最多）")
+    if k < 1 or not 0 <= r < k or lo > hi:
+        raise ValueError(f"配額不合理：{text}")
+    return {"k": k, "r": r, "min": lo, "max": hi}
+
+
+def clear_cache():
+    _cache.clear()
@@ -0,0 +1,115 @@
+# similar.py
+#
+# 歷史相似開獎搜尋：每期 5 個號碼存成一個 uint64 位元遮罩（號碼 n → 第 n-1 位元），
+# 與查詢號碼做 AND 後計算 popcount 即為重疊數；Jaccard = 重疊 / (聯集)。
+# 重疊數只有 0~5 六種值，先用 bincount 找出足夠 k 筆的最低門檻，
+# 再只對候選做排序，不需對整個歷史 argsort。
+
+import numpy as np
+
+import perf
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(a):
+        return _POP8[a.view(np.uint8)].reshape(len(a), 8).sum(axis=1, dtype=np.uint8)
+
+
+def to_mask(nums):
+    m = 0
+    for n in nums:
+        m |= 1 << (int(n) - 1)
+    return np.uint64(m)
+
+
+class DrawIndex:
+    def __init__(self, draws=()):
+        """draws：[(日期, 號碼們), ...]，需依日期排序"""
+        self.dates = [str(d) for d, _ in draws]
+        self.nums = [sorted(int(n) for n in nums) for _, nums in draws]
+        self._masks = np.zeros(max(16, len(self.dates)), dtype=np.uint64)
+        if self.nums:
+            idx = np.array(self.nums, dtype=np.uint64) - np.uint64(1)
+            self._masks[:len(self.nums)] = np.bitwise_or.reduce(np.left_shift(np.uint64(1), idx), axis=1)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def masks(self):
+        return self._masks[:len(self.dates)]
+
+    def append(self, date, nums):
+        """加入新的一期（陣列容量不足時加倍）"""
+        n = len(self.dates)
+        if n == len(self._masks):
+            grown = np.zeros(n * 2, dtype=np.uint64)
+            grown[:n] = self._masks
+            self._masks = grown
+        self._masks[n] = to_mask(nums)
+        self.dates.append(str(date))
+        self.nums.append(sorted(int(x) for x in nums))
+
+    @perf.timed("similar.query")
+    def query(self, nums, k=10, exclude=None):
+        """
+        回傳與 nums 最相似的 k 期（重疊數多者優先，同分時較近期者優先），
+        每筆含下一期號碼。exclude 可指定要排除的期數索引（例如查詢的就是最新一期本身）。
+        """
+        q = to_mask(nums)
+        size = len(nums)
+        masks = self.masks
+        if not len(masks):
+            return []
+        overlap = _popcount(masks & q)
+        if exclude is not None:
+            exclude %= len(masks)
+            overlap[exclude] = 0
+        counts = np.bincount(overlap, minlength=size + 1)
+        if exclude is not None:
+            counts[0] -= 1               # 被排除的那一期不算入候選數
+        # 由高往低累加，找出至少有 k 筆的最低重疊門檻
+        threshold = 0
+        total = 0
+        for t in range(size, -1, -1):
+            total += counts[t]
+            if total >= k:
+                threshold = t
+                break
+        cand = np.flatnonzero(overlap >= threshold) if threshold else np.arange(len(masks))
+        if exclude is not None:
+            cand = cand[cand != exclude]
+        cand = cand[np.lexsort((-cand, -overlap[cand].astype(np.int64)))][:k]
+
+        results = []
+        for i in cand.tolist():
+            inter = int(overlap[i])
+            has_next = i + 1 < len(self.dates)
+            results.append({
+                "index": i,
+                "date": self.dates[i],
+                "nums": self.nums[i],
+                "overlap": inter,
+                "jaccard": round(inter / (size + len(self.nums[i]) - inter), 3),
+                "common": sorted(set(self.nums[i]) & set(int(n) for n in nums)),
+                "next_date": self.dates[i + 1] if has_next else None,
+                "next_nums": self.nums[i + 1] if has_next else None,
+            })
+        return results
+
+    def query_latest(self, k=10):
+        """以最新一期為查詢，排除它自己"""
+        if not self.dates:
+            return []
+        return self.query(self.nums[-1], k, exclude=len(self.dates) - 1)
+
+    def next_scores(self, nums, k=50, exclude=None):
+        """(39,) 分數：相似各期的下一期號碼，以重疊數加權累加"""
+        scores = np.zeros(39, dtype=np.float64)
+        for r in self.query(nums, k, exclude):
+            if r["next_nums"]:
+                scores[np.array(r["next_nums"]) - 1] += r["overlap"]
+        return scores
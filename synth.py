@@ -0,0 +1,91 @@
+# synth.py
+#
+# 產生可重現（固定 seed）的今彩539 模擬開獎歷史，供效能測試使用：
+#   - 每期從 1~39 不重複抽 5 個號碼（由小到大排序）
+#   - 日期沿用實際開獎規則：週一到週六每天一期，週日不開獎
+#     （每年約 313 期；從 1990 年起 100k 期約到 2309 年，1M 期約到 5184 年、約 3,200 個年度分頁）
+#   - 可輸出成與 539_by_year.xlsx 相同格式的活頁簿（每年一個分頁），或 .npz 二進位格式
+#
+# 執行：python synth.py 100000 --out /tmp/539_100k.xlsx [--npz /tmp/539_100k.npz] [--seed 1]
+
+import argparse
+from datetime import date
+
+import numpy as np
+
+HEADER = ["開獎日", "號碼1", "號碼2", "號碼3", "號碼4", "號碼5"]
+CHUNK = 100_000   # 每批產生的期數，避免 1M×39 的亂數矩陣一次佔滿記憶體
+
+
+def draw_dates(n, start=date(1990, 1, 1)):
+    """
+    回傳 n 個開獎日期（datetime64[D]），跳過週日。
+    日期不重複（load_draws 以日期為鍵），所以期數越多跨越的年份越長：n 期約 n / 313 年。
+    """
+    # 每 7 天有 6 期：先以「週」為單位展開再去掉週日
+    weeks = n // 6 + 2
+    days = np.datetime64(start, "D") + np.arange(weeks * 7)
+    weekday = (days.astype("int64") + 3) % 7      # 1970-01-01 是週四 → 0=週一
+    return days[weekday != 6][:n]
+
+
+def generate_draws(n, seed=0, start=date(1990, 1, 1)):
+    """回傳 (dates: datetime64[D] (n,), nums: uint8 (n, 5))"""
+    rng = np.random.default_rng(seed)
+    nums = np.empty((n, 5), dtype=np.uint8)
+    for lo in range(0, n, CHUNK):
+        hi = min(n, lo + CHUNK)
+        # 對每一列的 39 個亂數取最小 5 個的位置 = 不重複抽 5 個號碼
+        keys = rng.random((hi - lo, 39), dtype=np.float32)
+        pick = np.argpartition(keys, 5, axis=1)[:, :5] + 1
+        pick.sort(axis=1)
+        nums[lo:hi] = pick
+    return draw_dates(n, start), nums
+
+
+def write_workbook(path, dates, nums):
+    """以 write_only 串流寫出與 539_by_year.xlsx 相同版面的活頁簿"""
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    years = dates.astype("datetime64[Y]").astype(int) + 1970
+    ws, current = None, None
+    for d, y, row in zip(dates.astype(str), years, nums.tolist()):
+        if y != current:
+            ws = wb.create_sheet(title=str(y))
+            ws.append(HEADER)
+            current = y
+        ws.append([d] + row)
+    wb.save(path)
+
+
+def write_npz(path, dates, nums):
+    np.savez(path, dates=dates, nums=nums)
+
+
+def load_npz(path):
+    data = np.load(path)
+    return data["dates"], data["nums"]
+
+
+def to_draws(dates, nums):
+    """轉成 main_module.load_draws() 的格式：[(日期字串, [五個號碼]), ...]"""
+    return list(zip(dates.astype(str).tolist(), nums.tolist()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="產生今彩539 模擬開獎歷史")
+    parser.add_argument("draws", type=int, help="期數，例如 1000 ~ 1000000")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="輸出 xlsx 路徑")
+    parser.add_argument("--npz", help="輸出 npz 路徑")
+    args = parser.parse_args(argv)
+    dates, nums = generate_draws(args.draws, args.seed)
+    if args.out:
+        write_workbook(args.out, dates, nums)
+    if args.npz:
+        write_npz(args.npz, dates, nums)
+    print(f"{args.draws} 期：{dates[0]} ~ {dates[-1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# test_scheduler.py
+#
+# 以假時鐘、假抓取函式測試背景更新程式；所有檔案寫在 pytest 的暫存資料夾。
+# 執行：python -m pytest -q
+
+import os
+import asyncio
+from datetime import datetime
+
+import pytest
+
+import main_module as core
+import scheduler
+
+DRAWS = [
+    ("2025-08-06", [1, 2, 3, 4, 5]),
+    ("2025-08-07", [6, 7, 8, 9, 10]),
+    ("2025-08-08", [1, 6, 11, 12, 13]),
+]
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(core, "EXCEL_FILE", str(tmp_path / "539_by_year.xlsx"))
+    monkeypatch.setattr(core, "LATEST_FILE", str(tmp_path / "539_latest_draw.json"))
+    core.write_draws(DRAWS)
+    history_csv = tmp_path / "recommend_history.csv"
+    history_csv.write_text('2025-08-07 21:00:00,2025-08-07,"1,6,20,21,22"\n', encoding="utf-8")
+
+    async def no_sleep(seconds):
+        pass
+
+    d = scheduler.DrawScheduler(clock=lambda: datetime(2025, 8, 9, 21, 0), sleep=no_sleep,
+                                fetch=lambda year, month: [],
+                                status_file=str(tmp_path / "status.json"), history_csv=str(history_csv))
+    d.load()
+    return d
+
+
+def test_no_new_draw_keeps_precomputed_hits(daemon):
+    assert asyncio.run(daemon.run_once()) is False     # 今天沒有開獎
+    daemon._write_status()
+
+    expected = core.check_hits(DRAWS, daemon.history_csv)
+    assert len(expected) == 1
+    assert scheduler.precomputed_hits(daemon.history_csv, daemon.status_file) == [tuple(r) for r in expected]
+
+
+def test_history_change_invalidates_then_recomputes_hits(daemon):
+    daemon._write_status()
+    with open(daemon.history_csv, "a", encoding="utf-8") as f:
+        f.write('2025-08-08 21:00:00,2025-08-06,"6,7,30,31,32"\n')
+    os.utime(daemon.history_csv, (0, 0))                # 確保修改時間與對獎時不同
+    assert scheduler.precomputed_hits(daemon.history_csv, daemon.status_file) is None
+
+    asyncio.run(daemon.run_once())
+    daemon._write_status()
+    rows = scheduler.precomputed_hits(daemon.history_csv, daemon.status_file)
+    assert rows == [tuple(r) for r in core.check_hits(DRAWS, daemon.history_csv)]
+    assert len(rows) == 2
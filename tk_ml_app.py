@@ -1,31 +1,67 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
+import numpy as np
 import pandas as pd
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split, GridSearchCV
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, ParameterGrid, cross_val_score
 from sklearn.metrics import accuracy_score, classification_report
-import threading
-from excel import load_history_data
+from excel import load_history_data, load_history_dataset
+from jobs import JobCancelled
+from tk_tasks import TkTaskRunner
+import main_module as core
+import scoring
+
+ML_WEIGHT = 1.0   # ML 機率在綜合評分中的權重
 
 class DataLoader:
     def load_history(self):
         return load_history_data(window=30)   # 你可以調 window 長度
 
+    def load_dataset(self, draws=None):
+        return load_history_dataset(window=30, draws=draws)
+
+def _top5_hits(estimator, X, Y):
+    """多標籤評分：每期機率前 5 碼命中下一期的平均個數（亂猜期望值 25/39 ≈ 0.64）"""
+    P = _positive_proba(estimator, X)
+    top5 = np.argsort(-P, axis=1)[:, :5]
+    return float(np.take_along_axis(np.asarray(Y), top5, axis=1).sum(axis=1).mean())
+
+def _positive_proba(estimator, X):
+    """多輸出分類器的 predict_proba 是 39 個 (n, 2) 陣列；取出每個號碼「會開出」的機率 → (n, 39)"""
+    out = np.zeros((len(X), 39), dtype=np.float32)
+    for k, (p, classes) in enumerate(zip(estimator.predict_proba(X), estimator.classes_)):
+        if 1 in classes:
+            out[:, k] = p[:, list(classes).index(1)]
+    return out
+
 class ModelTrainer:
-    def __init__(self, data_loader, features, target='number', cv=5):
+    """
+    multilabel=False：舊版長格式，每列一個號碼（target 欄）
+    multilabel=True：每期一列，以該期特徵預測下一期 39 碼是否開出（HistoryDataset）
+    """
+    def __init__(self, data_loader, features, target='number', cv=5, multilabel=False):
         self.loader = data_loader
         self.features = features
         self.target = target
         self.cv = cv
+        self.multilabel = multilabel
         self.model = None
 
     def prepare_data(self):
+        if self.multilabel:
+            X, Y = self.loader.load_dataset().training_arrays(self.features)
+            return train_test_split(X, Y, test_size=0.2, random_state=42)
         df = self.loader.load_history()
         X = df[self.features]
         y = df[self.target]
         return train_test_split(X, y, test_size=0.2, random_state=42)
 
-    def train(self):
+    def train(self, progress=None):
+        """
+        逐組參數交叉驗證後以最佳參數重新訓練。
+        progress(done, total, message) 會在每組參數開始前被呼叫（可在其中丟出例外以中止）。
+        """
         X_train, X_test, y_train, y_test = self.prepare_data()
         # 自動調參範圍
         param_grid = {
@@ -34,17 +70,34 @@ class ModelTrainer:
             'min_samples_split': [2,5,10]
         }
         base = RandomForestClassifier(random_state=42)
-        gs = GridSearchCV(base, param_grid, cv=self.cv, n_jobs=-1)
-        gs.fit(X_train, y_train)
-        self.model = gs.best_estimator_
+        scorer = _top5_hits if self.multilabel else None
+        candidates = list(ParameterGrid(param_grid))
+        best_params, best_score = None, -np.inf
+        for i, params in enumerate(candidates):
+            if progress:
+                progress(i, len(candidates), f"調參 {i + 1}/{len(candidates)}：{params}")
+            score = cross_val_score(clone(base).set_params(**params), X_train, y_train,
+                                    cv=self.cv, scoring=scorer, n_jobs=-1).mean()
+            if score > best_score:
+                best_params, best_score = params, score
+        if progress:
+            progress(len(candidates), len(candidates), "以最佳參數重新訓練")
+        self.model = clone(base).set_params(**best_params).fit(X_train, y_train)
 
         preds = self.model.predict(X_test)
+        if self.multilabel:
+            hits = _top5_hits(self.model, X_test, y_test)
+            report = classification_report(y_test, preds, zero_division=0,
+                                           target_names=[str(n) for n in range(1, 40)])
+            return best_params, hits, report
         acc = accuracy_score(y_test, preds)
         report = classification_report(y_test, preds, zero_division=0)
-        return gs.best_params_, acc, report
+        return best_params, acc, report
 
-    def predict_next(self, features_df):
-        prob = self.model.predict_proba(features_df)[0]
+    def predict_next(self, features):
+        if self.multilabel:
+            return list(zip(range(1, 40), _positive_proba(self.model, features)[0]))
+        prob = self.model.predict_proba(features)[0]
         return list(zip(self.model.classes_, prob))
 
 class App(tk.Tk):
@@ -58,28 +111,94 @@ class App(tk.Tk):
             'high_low_ratio','consecutive_pairs','gap_mean','recent_count'
         ]
         self.loader = DataLoader()
-        self.trainer = ModelTrainer(self.loader, self.features)
+        self.trainer = ModelTrainer(self.loader, self.features, multilabel=True)
+
+        self.runner = TkTaskRunner(self)
 
         ttk.Button(self, text="訓練並調參", command=self.train_model).pack(pady=10)
+        self.progress = ttk.Progressbar(self, maximum=1.0)
+        self.progress.pack(fill=tk.X, padx=10)
+        self.status = tk.StringVar(value="")
+        frm = ttk.Frame(self)
+        frm.pack(fill=tk.X, padx=10)
+        ttk.Label(frm, textvariable=self.status).pack(side=tk.LEFT)
+        self.btn_cancel = ttk.Button(frm, text="取消", state=tk.DISABLED,
+                                     command=lambda: self.runner.cancel("train"))
+        self.btn_cancel.pack(side=tk.RIGHT)
         self.txt = tk.Text(self, height=15)
         self.txt.pack(fill=tk.BOTH, padx=10)
         ttk.Button(self, text="推薦號碼", command=self.recommend).pack(pady=10)
 
     def train_model(self):
-        def job():
-            best_params, acc, report = self.trainer.train()
-            out = f"最佳參數: {best_params}\n測試集準確率: {acc:.3f}\n\n" + report
+        # 訓練在背景執行緒進行，結果回到主執行緒後才寫入 self.txt
+        def finish():
+            self.progress["value"] = 0
+            self.status.set("")
+            self.btn_cancel.config(state=tk.DISABLED)
+
+        def on_progress(value, message):
+            self.progress["value"] = value
+            self.status.set(message)
+
+        def done(result):
+            finish()
+            best_params, acc, report = result
+            out = f"最佳參數: {best_params}\n測試集前 5 碼平均命中: {acc:.3f}（亂猜 0.641）\n\n" + report
             self.txt.delete(1.0, tk.END)
             self.txt.insert(tk.END, out)
-        threading.Thread(target=job).start()
+
+        def error(e):
+            finish()
+            if isinstance(e, JobCancelled):
+                messagebox.showinfo("已取消", "訓練已取消")
+            else:
+                messagebox.showerror("訓練失敗", str(e))
+
+        job = self.runner.submit("train", lambda job: self.trainer.train(progress=job.report),
+                                 on_done=done, on_error=error, on_progress=on_progress)
+        if job is None:
+            messagebox.showinfo("訓練中", "模型正在訓練，請稍候")
+        else:
+            self.status.set("讀取資料…")
+            self.btn_cancel.config(state=tk.NORMAL)
+
+    def _recommend_job(self, job):
+        # 開獎資料只讀一次，ML 特徵與綜合評分共用
+        job.report(0, 3, "讀取開獎資料…")
+        draws = core.load_draws()
+        job.report(1, 3, "計算 ML 機率…")
+        results = self.trainer.predict_next(self.loader.load_dataset(draws).latest(self.features))
+
+        # ML 機率當作一個訊號，與轉移、頻率、遺漏等訊號一起綜合評分
+        job.report(2, 3, "綜合評分…")
+        probs = dict(results)
+        engine = scoring.ScoringEngine()
+        engine.add_scorer("ml", scoring.probability_scorer(lambda draws: probs), ML_WEIGHT)
+        return results, engine.score(draws)
 
     def recommend(self):
-        df = self.loader.load_history()
-        last = df.tail(1)[self.features]
-        results = self.trainer.predict_next(last)
-        top5 = sorted(results, key=lambda x: x[1], reverse=True)[:5]
-        msg = "推薦號碼 (機率)：\n" + "\n".join(f"{n}: {p:.3f}" for n,p in top5)
-        messagebox.showinfo("推薦結果", msg)
+        # 讀 Excel 與計算所有訊號都在背景執行，視窗不會卡住
+        if self.trainer.model is None:
+            messagebox.showwarning("尚未訓練", "請先按『訓練並調參』")
+            return
+
+        def done(result):
+            self.status.set("")
+            results, combined = result
+            top5 = sorted(results, key=lambda x: x[1], reverse=True)[:5]
+            msg = ("推薦號碼 (機率)：\n" + "\n".join(f"{n}: {p:.3f}" for n,p in top5)
+                   + f"\n\n綜合評分前 5：{combined['top5']}"
+                   + "\n" + "、".join(f"{k} {v * 1000:.1f}ms" for k, v in combined["timings"].items()))
+            messagebox.showinfo("推薦結果", msg)
+
+        def error(e):
+            self.status.set("")
+            messagebox.showerror("推薦失敗", str(e))
+
+        job = self.runner.submit("recommend", self._recommend_job, on_done=done, on_error=error,
+                                 on_progress=lambda value, message: self.status.set(message))
+        if job is None:
+            messagebox.showinfo("計算中", "推薦正在計算，請稍候")
 
 if __name__ == '__main__':
     app = App()
@@ -0,0 +1,65 @@
+# tk_tasks.py
+#
+# Tkinter 用的背景工作執行器：
+#   - 工作在 jobs.JobManager 的執行緒池中執行，不佔用 Tk 主迴圈
+#   - 完成結果由工作執行緒放進 queue，主執行緒用 after() 定時取出後才呼叫回呼，
+#     所以 on_done / on_error / on_progress 內可以放心操作元件
+#   - 同一個 key 正在執行時不會重複送出；可呼叫 cancel(key) 要求取消
+
+import queue
+
+import jobs
+
+
+class TkTaskRunner:
+    def __init__(self, root, manager=None, poll_ms=100):
+        self.root = root
+        self.manager = manager or jobs.JobManager(max_workers=2)
+        self.poll_ms = poll_ms
+        self._queue = queue.Queue()
+        self._watched = {}   # key -> (job, on_progress)
+        self.root.after(self.poll_ms, self._poll)
+
+    def submit(self, key, func, *args, on_done=None, on_error=None, on_progress=None, **kwargs):
+        """
+        送出工作 func(job, *args, **kwargs)。
+        同一個 key 還在執行時回傳 None（不重複送出），否則回傳 Job。
+        """
+        if self.manager.running(key):
+            return None
+        job = self.manager.submit(key, func, *args, **kwargs)
+        self._watched[key] = (job, on_progress)
+
+        def done(fut):
+            # 在工作執行緒中呼叫：只放進 queue，不碰任何 Tk 元件
+            self._queue.put((key, job, on_done, on_error))
+
+        job.future.add_done_callback(done)
+        return job
+
+    def running(self, key):
+        return self.manager.running(key)
+
+    def cancel(self, key):
+        job = self.manager.get(key)
+        if job is not None and not job.done:
+            job.cancel()
+
+    def _poll(self):
+        for key, (job, on_progress) in list(self._watched.items()):
+            if on_progress and not job.done:
+                on_progress(job.progress, job.message)
+        while True:
+            try:
+                key, job, on_done, on_error = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if self._watched.get(key, (None, None))[0] is job:
+                del self._watched[key]
+            err = job.future.exception()
+            if err is None:
+                if on_done:
+                    on_done(job.future.result())
+            elif on_error:
+                on_error(err)
+        self.root.after(self.poll_ms, self._poll)
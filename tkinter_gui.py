@@ -1,8 +1,11 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
 import datetime, os, csv, re, math
-from bisect import bisect_right
 import main_module as core
+from jobs import JobCancelled, exclusive
+from tk_tasks import TkTaskRunner
+import similar
+import scheduler
 
 # === 路徑與檔名（固定寫在程式同一資料夾） ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -14,29 +17,115 @@ HISTORY_CSV  = os.path.join(BASE_DIR, "recommend_history.csv")   # 機器可讀
 # 工具與核心動作（函式）
 # =========================
 
-def run_and_alert(func, success_msg="✅ 完成", fail_msg="⚠️ 發生錯誤"):
-    try:
-        func()
+_progress = {}   # key -> (進度 0~1 或 None, 訊息)；None 表示無法回報進度的工作
+
+def _render_progress():
+    """
+    依所有進行中的工作更新共用的進度列：
+      - 有回報進度的工作：顯示平均進度，取消鈕可用
+      - 只剩無法回報進度的工作：進度列改為不定長度動畫，取消鈕停用
+    """
+    determinate = [v for v, _ in _progress.values() if v is not None]
+    status_var.set("｜".join(msg for _, msg in _progress.values() if msg))
+    if determinate:
+        progress_bar.stop()
+        progress_bar.config(mode="determinate")
+        progress_var.set(sum(determinate) / len(determinate) * 100)
+    elif _progress:
+        if str(progress_bar.cget("mode")) != "indeterminate":
+            progress_bar.config(mode="indeterminate")
+            progress_bar.start(10)
+    else:
+        progress_bar.stop()
+        progress_bar.config(mode="determinate")
+        progress_var.set(0)
+    btn_cancel.config(state=tk.NORMAL if determinate else tk.DISABLED)
+
+def _start_progress(key, message, cancellable=True):
+    _progress[key] = (0.0 if cancellable else None, message)
+    _render_progress()
+
+def _set_progress(key, value, message=""):
+    if key in _progress and _progress[key][0] is not None:
+        _progress[key] = (value, message)
+        _render_progress()
+
+def _finish_progress(key):
+    _progress.pop(key, None)
+    _render_progress()
+
+def _workbook_job(func):
+    """讀寫 Excel 的工作共用 core.workbook_lock，一次只執行一個（不同按鈕的工作也一樣）"""
+    return exclusive(core.workbook_lock, func, "等待其他 Excel 工作完成…")
+
+def run_and_alert(key, func, success_msg="✅ 完成", fail_msg="⚠️ 發生錯誤", on_done=None, cancellable=True):
+    """
+    在背景執行 func(job)，完成後於主執行緒跳出提示。
+    同一項工作進行中時不會重複啟動；會讀寫 Excel 的 func 請先以 _workbook_job() 包裝。
+    cancellable=True 的工作必須在各階段呼叫 job.report()，才能顯示進度與回應取消。
+    """
+    def done(result):
+        _finish_progress(key)
         messagebox.showinfo("執行完成", success_msg)
-    except Exception as e:
-        messagebox.showerror("錯誤", f"{fail_msg}\n{e}")
+        if on_done:
+            on_done(result)
+
+    def error(e):
+        _finish_progress(key)
+        if isinstance(e, JobCancelled):
+            messagebox.showinfo("已取消", "工作已取消")
+        else:
+            messagebox.showerror("錯誤", f"{fail_msg}\n{e}")
+
+    job = runner.submit(key, func, on_done=done, on_error=error,
+                        on_progress=lambda value, message: _set_progress(key, value, message))
+    if job is None:
+        messagebox.showinfo("執行中", "這項工作正在進行，請稍候")
+    else:
+        _start_progress(key, "執行中…", cancellable)
+
+def on_cancel():
+    for key, (value, _) in _progress.items():
+        if value is not None:
+            runner.cancel(key)
+
+def _update_job(job):
+    core.update_history(progress=job.report)
+    job.report(1, 1, "更新今日資料")
+    return core.update_today()
 
 def on_update_all():
-    run_and_alert(core.update_history, "✅ 歷史資料已更新")
-    ok = core.update_today()
-    if ok:
-        messagebox.showinfo("✅", "今天資料已更新")
-    else:
-        messagebox.showwarning("⚠️", "今天尚未開獎或無資料")
+    def today_done(ok):
+        if ok:
+            messagebox.showinfo("✅", "今天資料已更新")
+        else:
+            messagebox.showwarning("⚠️", "今天尚未開獎或無資料")
+    run_and_alert("update", _workbook_job(_update_job), "✅ 歷史資料已更新", on_done=today_done)
 
 def on_generate_stats():
-    run_and_alert(core.generate_stats, "✅ 統計已完成")
+    run_and_alert("stats", _workbook_job(lambda job: core.generate_stats(progress=job.report)), "✅ 統計已完成")
+
+def _show_chart(path):
+    """在新視窗顯示產出的圖表；Tk 無法讀取圖檔時改顯示存檔路徑"""
+    win = tk.Toplevel(root)
+    win.title("3 的倍數號碼出現次數")
+    try:
+        img = tk.PhotoImage(file=path)
+    except tk.TclError:
+        img = None
+    if img is not None:
+        lbl = tk.Label(win, image=img)
+        lbl.image = img            # 保留參照，避免圖片被回收
+        lbl.pack(fill=tk.BOTH, expand=True)
+    tk.Label(win, text=f"已存檔：{path}", anchor="w").pack(fill="x", padx=10, pady=6)
 
 def on_generate_chart():
-    run_and_alert(core.generate_multiples_of_3_chart, "✅ 圖表已產出")
+    run_and_alert("chart", _workbook_job(lambda job: core.generate_multiples_of_3_chart(progress=job.report)),
+                  "✅ 圖表已產出", on_done=_show_chart)
 
 def on_generate_transition():
-    run_and_alert(core.analyze_transition_patterns, "✅ 轉移分析完成")
+    run_and_alert("transition", _workbook_job(lambda job: core.analyze_transition_patterns(progress=job.report)),
+                  "✅ 轉移分析完成")
 
 
 # ---------- 開獎資料讀取輔助 ----------
@@ -83,70 +172,74 @@ def _get_latest_draw():
     draws = _get_all_draws()
     return draws[-1] if draws else (None, set())
 
-def _parse_csv_date(s: str):
-    """允許 YYYY-MM-DD / YYYY/M/D / 含時間 的多種格式（CSV用）"""
-    s = (s or "").strip()
-    fmts = (
-        "%Y-%m-%d", "%Y/%m/%d",
-        "%Y-%m-%d %H:%M", "%Y/%m/%d %H:%M",
-        "%Y-%m-%d %H:%M:%S", "%Y/%m/%d %H:%M:%S",
-    )
-    for fmt in fmts:
-        try:
-            return datetime.datetime.strptime(s, fmt).date()
-        except Exception:
-            pass
-    m = re.match(r"^\s*(\d{4})[/-](\d{1,2})[/-](\d{1,2})", s)
-    if m:
-        y, mth, d = map(int, m.groups())
-        return datetime.date(y, mth, d)
-    return None
-
 
 # ---------- 推薦 / 歷史 / 檢查命中 ----------
 
-def on_recommend():
+def _show_and_record(title, last_nums, top10, top5, top3_m3, extra=""):
     """
-    顯示推薦號碼：使用 core.recommend_by_transition()
-    並同時寫入：
+    顯示推薦號碼並寫入推薦歷史：
       - recommend_history.txt（人類可讀）
       - recommend_history.csv（機器可讀，之後用來比對下一期是否中獎）
     """
-    try:
-        result = core.recommend_by_transition()
-        if not result:
-            messagebox.showwarning("尚未分析", "請先執行『轉移分析』功能")
-            return
-
-        last_nums, top10, top5 = result
-        top3_m3 = [n for n in top10 if n % 3 == 0][:3]
-
-        # 這次推薦的「基準日期」：目前 Excel 最新一期；之後用「下一期」來對獎
-        base_date, _ = _get_latest_draw()   # datetime.date
-
-        now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        msg = (
-            f"🕒 {now_str}\n"
-            f"📅 最近一期號碼：{tuple(last_nums)}\n"
-            f"🎯 推薦號碼（10）：{top10}\n"
-            f"🏆 機率最高前 5：{top5}\n"
-            f"🔢 3 的倍數前三：{top3_m3}"
-        )
-        messagebox.showinfo("推薦結果", msg)
+    # 這次推薦的「基準日期」：目前 Excel 最新一期；之後用「下一期」來對獎
+    base_date, _ = _get_latest_draw()   # datetime.date
+
+    now_str = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    msg = (
+        f"🕒 {now_str}\n"
+        f"📅 最近一期號碼：{tuple(last_nums)}\n"
+        f"🎯 推薦號碼（10）：{top10}\n"
+        f"🏆 機率最高前 5：{top5}\n"
+        f"🔢 3 的倍數前三：{top3_m3}"
+    )
+    messagebox.showinfo(title, msg + extra)
 
-        # 人類可讀歷史
-        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
-            f.write(msg.replace("\n", " | ") + "\n")
+    # 人類可讀歷史
+    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+        f.write(msg.replace("\n", " | ") + "\n")
 
-        # 機器可讀歷史（用來對獎）：timestamp, base_date, top5
-        if base_date:
-            with open(HISTORY_CSV, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow([now_str, base_date.strftime("%Y-%m-%d"),
-                                 ",".join(map(str, top5))])
+    # 機器可讀歷史（用來對獎）：timestamp, base_date, top5
+    if base_date:
+        with open(HISTORY_CSV, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([now_str, base_date.strftime("%Y-%m-%d"),
+                             ",".join(map(str, top5))])
 
-    except Exception as e:
-        messagebox.showerror("on_recommend 發生例外", str(e))
+def on_recommend():
+    """
+    顯示推薦號碼：在背景以 core.recommend_by_score()（綜合評分引擎）計算，
+    完成後顯示推薦與各訊號耗時，並同時寫入推薦歷史（TXT + CSV）
+    """
+    def done(result):
+        _finish_progress("score")
+        if result is None:
+            messagebox.showwarning("沒有開獎資料", "請先更新 Excel 歷史資料")
+            return
+        timings = "、".join(f"{k} {v * 1000:.1f}ms{'（快取）' if result['cached'][k] else ''}"
+                           for k, v in result["timings"].items())
+        try:
+            _show_and_record("推薦結果", result["last_nums"], result["top10"], result["top5"],
+                             result["multiples_of_3"], f"\n⏱️ {timings}")
+        except Exception as e:
+            messagebox.showerror("on_recommend 發生例外", str(e))
+
+    def error(e):
+        _finish_progress("score")
+        if isinstance(e, JobCancelled):
+            messagebox.showinfo("已取消", "工作已取消")
+        else:
+            messagebox.showerror("錯誤", f"⚠️ 推薦失敗\n{e}")
+
+    def work(job):
+        job.report(0, 1, "計算綜合評分")
+        return core.recommend_by_score()
+
+    job = runner.submit("score", _workbook_job(work), on_done=done, on_error=error,
+                        on_progress=lambda value, message: _set_progress("score", value, message))
+    if job is None:
+        messagebox.showinfo("執行中", "這項工作正在進行，請稍候")
+    else:
+        _start_progress("score", "計算綜合評分…")
 
 def on_show_history_recommend():
     """顯示『人類可讀』推薦歷史（recommend_history.txt）"""
@@ -190,54 +283,20 @@ def on_clear_history():
 def on_check_hits():
     """
     逐筆推薦對照『下一期』是否中獎（以 top5 為準）
-    來源：recommend_history.csv 的 (timestamp, base_date, top5)
+    來源：recommend_history.csv 的 (timestamp, base_date, top5)；
+    背景更新程式已算好且仍是最新時直接使用，否則以 core.check_hits() 計算
     """
     if not os.path.exists(HISTORY_CSV):
         messagebox.showinfo("尚無紀錄", "目前沒有任何推薦歷史（CSV）")
         return
 
-    # 載入所有開獎
-    draws = _get_all_draws()
-    if not draws:
-        messagebox.showwarning("沒有開獎資料", "請先更新 Excel 歷史資料")
-        return
-    dates = [d[0] for d in draws]  # 排序好的所有日期（datetime.date）
-
-    rows = []
-    with open(HISTORY_CSV, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        for r in reader:
-            if len(r) < 3:
-                continue
-            ts_str, base_str, top5_str = r[0], r[1], r[2]
-
-            # 解析基準日期（相容 2025-08-08 / 2025/8/8 等）
-            base_dt = _parse_csv_date(base_str)
-            if not base_dt:
-                rows.append((ts_str, base_str, "（日期格式錯誤）", "-", "-"))
-                continue
-
-            # 解析推薦 top5 集合
-            try:
-                rec_top5 = set(int(x) for x in top5_str.split(",") if x.strip().isdigit())
-            except Exception:
-                rec_top5 = set()
-
-            # 找『下一期』：第一個日期 > base_dt
-            idx = bisect_right(dates, base_dt)
-            if idx >= len(dates):
-                rows.append((ts_str, base_str, "（尚無下一期）", "-", "-"))
-                continue
-
-            target_dt, target_nums = draws[idx]
-            hits = sorted(rec_top5.intersection(target_nums))
-            rows.append((
-                ts_str,
-                base_dt.strftime("%Y-%m-%d"),
-                target_dt.strftime("%Y-%m-%d"),
-                f"{len(hits)}",
-                str(hits)
-            ))
+    rows = scheduler.precomputed_hits(HISTORY_CSV)
+    if rows is None:
+        draws = core.load_draws()
+        if not draws:
+            messagebox.showwarning("沒有開獎資料", "請先更新 Excel 歷史資料")
+            return
+        rows = core.check_hits(draws, HISTORY_CSV)
 
     # 顯示檢查結果
     win = tk.Toplevel(root)
@@ -255,6 +314,32 @@ def on_check_hits():
         tree.insert("", "end", values=row)
 
 
+# ---------- 相似歷史開獎 ----------
+
+def on_similar_draws():
+    """列出與最近一期最相似的歷史開獎，以及各自的下一期號碼"""
+    draws = _get_all_draws()
+    if not draws:
+        messagebox.showwarning("沒有開獎資料", "請先更新 Excel 歷史資料")
+        return
+    results = similar.DrawIndex(draws).query_latest(20)
+
+    win = tk.Toplevel(root)
+    win.title(f"與最近一期 {sorted(draws[-1][1])} 相似的歷史開獎")
+    win.geometry("760x460")
+
+    cols = ("日期", "號碼", "重疊數", "共同號碼", "下一期日期", "下一期號碼")
+    tree = ttk.Treeview(win, columns=cols, show="headings", height=18)
+    for c, w in zip(cols, (100, 160, 60, 120, 100, 160)):
+        tree.heading(c, text=c)
+        tree.column(c, width=w, anchor="center")
+    tree.pack(fill=tk.BOTH, expand=True)
+
+    for r in results:
+        tree.insert("", "end", values=(r["date"], str(r["nums"]), r["overlap"], str(r["common"]),
+                                       r["next_date"] or "（尚無下一期）", str(r["next_nums"] or "-")))
+
+
 # ---------- 新功能：組合與金額計算 ----------
 
 def _parse_numbers(s: str):
@@ -344,7 +429,7 @@ def on_calc_price():
 
 root = tk.Tk()
 root.title("今彩539 資料分析工具")
-root.geometry("460x760")
+root.geometry("460x890")
 root.resizable(False, False)
 
 font_btn = ("Microsoft JhengHei", 11)
@@ -364,12 +449,25 @@ buttons = [
     ("🎯 顯示推薦號碼", on_recommend),
     ("📚 顯示推薦歷史", on_show_history_recommend),
     ("🔎 檢查推薦是否中獎（對照下一期）", on_check_hits),
+    ("🔍 相似歷史開獎", on_similar_draws),
     ("💰 計算組合與金額", on_calc_price),       # ← 新增
     ("🗑️ 清除推薦歷史（TXT+CSV）", on_clear_history),
 ]
 for text, cmd in buttons:
     tk.Button(frame, text=text, font=font_btn, width=36, command=cmd).pack(pady=5)
 
+# 背景工作進度
+progress_var = tk.DoubleVar(value=0)
+status_var = tk.StringVar(value="")
+progress_bar = ttk.Progressbar(root, variable=progress_var, maximum=100, length=360)
+progress_bar.pack(pady=(8, 0))
+frm_status = tk.Frame(root)
+frm_status.pack()
+tk.Label(frm_status, textvariable=status_var, fg="gray").pack(side=tk.LEFT)
+btn_cancel = tk.Button(frm_status, text="取消", command=on_cancel, state=tk.DISABLED)
+btn_cancel.pack(side=tk.LEFT, padx=6)
+runner = TkTaskRunner(root)
+
 # 版本資訊
 tk.Label(root, text="版本 1.5", fg="gray").pack(pady=10)
 